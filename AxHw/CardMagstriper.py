@@ -41,6 +41,8 @@ class CardMagstriper(DeviceBase):
     def __init__(self, mac_address, enable_statistics=False):
         DeviceBase.__init__(self,enable_statistics);
         self.mac_address = bytearray.fromhex(mac_address);
+        #tracks loaded on the device and not sent yet, None if unknown
+        self.loaded_tracks = None;
 
     def device_lookup(self):
         self.device = AxUDPCommandSenderManager(UDPMagics.CardMagstriperMagic);
@@ -61,14 +63,22 @@ class CardMagstriper(DeviceBase):
         logging.info("Initialization of magstriper successful...")
         return True;
 
+    def get_command_value(self, action):
+        return self.mag_layout[action].Brand or action;
+
     def send_command(self, action):
         Result = False;
 
         try:
             if(self.set_tracks(action)):
                 send_to = self.device.get_sender_for_device(self.mac_address);
-                Result = send_to.send_tracks();
-           
+                try:
+                    Result = send_to.send_tracks();
+                    #the device clears its tracks after sending them
+                    self.loaded_tracks = {};
+                except TimeoutError:
+                    self.loaded_tracks = None;
+                    raise;
 
         except TimeoutError as e:
             logging.error("The remote host did not respond in time");
@@ -85,32 +95,29 @@ class CardMagstriper(DeviceBase):
 
         return Result;
 
-
     def set_tracks(self, action):
-        Result = False;
-        try:
-            send_to = self.device.get_sender_for_device(self.mac_address);
-
-            if(self.mag_layout[action].Track1 is not None):
-                track_value = self.mag_layout[action].Track1;
-                
-                #special use case for track1. Reduce all characters for 0x20;
-                track_byte_array = [(x - 0x20) for x in bytearray(str.encode(track_value))];
-
-                track_bytes = bytes(track_byte_array);
-                Result = send_to.set_card_magstripe_track(AxUDPCardMagstriperCommand.SetTrack1, track_bytes);
+        """
+        Loads the tracks of an action in one burst. Tracks which are still loaded from an attempt whose
+        SendTracks failed are not sent again, tracks of another card are cleared first
+        """
+        tracks = self.mag_layout[action].tracks;
+        if(not tracks):
+            return False;
 
-            if(self.mag_layout[action].Track2 is not None):
-                track_value = self.mag_layout[action].Track2;
-                track_bytes = str.encode(track_value);
-                Result = send_to.set_card_magstripe_track(AxUDPCardMagstriperCommand.SetTrack2, track_bytes);
+        send_to = self.device.get_sender_for_device(self.mac_address);
 
-            if(self.mag_layout[action].Track3 is not None):
-                track_value = self.mag_layout[action].Track3;
-                track_bytes = str.encode(track_value);
-                Result = send_to.set_card_magstripe_track(AxUDPCardMagstriperCommand.SetTrack3, track_bytes);
+        if(self.loaded_tracks is None or any(command not in tracks for command in self.loaded_tracks)):
+            send_to.clear_tracks();
+            self.loaded_tracks = {};
 
-        except Error: 
-            Result = False;
+        missing = [track for track in tracks.values() if self.loaded_tracks.get(track.command) != track.data];
+        if(missing):
+            try:
+                send_to.send_track_frames([(track.command, track.frame) for track in missing]);
+            except:
+                #some of the tracks may have been loaded
+                self.loaded_tracks = None;
+                raise;
+            self.loaded_tracks.update((track.command, track.data) for track in missing);
 
-        return Result;
+        return True;
@@ -41,11 +41,14 @@ class CardMultiplexer(DeviceBase):
     def __init__(self, mac_address, enable_statistics=False):
         DeviceBase.__init__(self, enable_statistics);
         self.mac_address = bytearray.fromhex(mac_address);
+        #port switched on by the device, None if unknown
+        self.active_port = None;
 
     def device_lookup(self):
         self.device = AxUDPCommandSenderManager(UDPMagics.CardMultiplexerMagic);
         deviceIsPresent = self.device.device_lookup(self.mac_address);
         if deviceIsPresent:
+            self.device.get_sender_for_device(self.mac_address).reset_listener = self.forget_port;
             logging.info("CardMultiplexer ({}) is present".format(self.mac_address))
         else:
             logging.warning("CardMultiplexer ({}) is not present".format(self.mac_address))
@@ -58,14 +61,46 @@ class CardMultiplexer(DeviceBase):
             logging.warning("Initialization of multiplexer failed, skip...")
             return False;
 
+        self.sync_port();
         logging.info("Initialization of multiplexer successful...")
 
+    def get_command_value(self, action):
+        return self.mux_layout[action].Value;
+
+    def sync_port(self):
+        """Reads the active port from the device"""
+        try:
+            self.active_port = self.device.get_sender_for_device(self.mac_address).get_port();
+            logging.debug("CardMultiplexer ({}) is on port {}".format(self.mac_address, self.active_port));
+        except (OSError, AssertionError) as e:
+            logging.warning("Could not read the active port: {}".format(e));
+            self.active_port = None;
+
+        return self.active_port;
+
+    def forget_port(self):
+        """The device may have restarted on its default port, the next command sets the port again"""
+        self.active_port = None;
+
+    def status(self):
+        status = DeviceBase.status(self);
+        status['port'] = self.active_port;
+        return status;
+
     def send_command(self, action):
         Result = False
+        resync = False
         try:
            action_value = int(self.mux_layout[action].Value);
+           if(action_value == self.active_port):
+               logging.debug("port {} is already active".format(action_value));
+               return True;
+
            send_to = self.device.get_sender_for_device(self.mac_address);
+           self.active_port = None;
            Result = send_to.set_port(action_value);
+           if(Result is True):
+               self.active_port = action_value;
         
         except TimeoutError as e:
             logging.error("The remote host did not respond in time");
@@ -74,15 +109,13 @@ class CardMultiplexer(DeviceBase):
             pass;
         except AssertionError as e:
             logging.error("Remote host returned an error");
+            resync = True;
         except:
             traceback.print_exc()
             logging.error("general error");
 
-        return Result;
-
-        
-
-
-
-
+        if(resync):
+            #the device is reachable, ask which port it is on now
+            self.sync_port();
 
+        return Result;
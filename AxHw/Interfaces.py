@@ -1,63 +1,125 @@
 #!/usr/bin/python3
 
 from netifaces import interfaces, ifaddresses, AF_INET, AF_LINK
+import ipaddress;
+import threading;
+import time;
 import logging;
 
 class Interfaces(object):
+    """
+    Table of the local IPv4 interfaces, read from netifaces once and then served from memory.
+    The table is rebuilt after TTL seconds or on \ref refresh, e.g. when binding to an address failed.
+    """
+
+    TTL = 60.0;
+
+    mutex = threading.Lock();
+    #interface name -> {'addr', 'broadcast', 'network'}
+    table = None;
+    #interfaces which can send broadcasts, in netifaces order
+    broadcast_interfaces = [];
+    #(network, interface name), longest prefix first
+    subnets = [];
+    expires = 0.0;
 
     @staticmethod
-    def remove_loopback_from_list(list, config, interface):
+    def is_broadcast_interface(config):
+        """Loopback and point to point interfaces can not be used for the discovery"""
         try:
             if AF_LINK in config.keys():
                 for link in config[AF_LINK]:
                     if(len(link['addr']) == 0):
-                        list.remove(interface);
+                        return False;
 
-            if AF_INET in config.keys():
-                for link in config[AF_INET]:
-                    if 'broadcast' not in link.keys() and 'peer' in link.keys():
-                        list.remove(interface);
+            for link in config[AF_INET]:
+                if 'broadcast' not in link.keys() and 'peer' in link.keys():
+                    return False;
         except KeyError:
             logging.debug("received key error during loopback removal {}".format(config));
-            pass;
+
+        return True;
+
+    @staticmethod
+    def refresh():
+        """Reads all interfaces from the system"""
+        table = {};
+        broadcast_interfaces = [];
+        subnets = [];
+
+        for interface in interfaces():
+            config = ifaddresses(interface);
+            # AF_INET is not always present
+            if AF_INET not in config.keys():
+                broadcast_interfaces.append(interface);
+                continue;
+
+            entry = {'addr': None, 'broadcast': None, 'network': None};
+            for value in config[AF_INET]:
+                if(entry['addr'] is None and len(value.get('addr', '')) > 0):
+                    entry['addr'] = value['addr'];
+                    if(len(value.get('netmask', '')) > 0):
+                        try:
+                            entry['network'] = ipaddress.IPv4Interface("{}/{}".format(value['addr'], value['netmask'])).network;
+                        except ValueError:
+                            logging.debug("invalid netmask on {}: {}".format(interface, value));
+                if(entry['broadcast'] is None and len(value.get('broadcast', '')) > 0):
+                    entry['broadcast'] = value['broadcast'];
+
+            table[interface] = entry;
+            if(Interfaces.is_broadcast_interface(config)):
+                broadcast_interfaces.append(interface);
+            if(entry['network'] is not None):
+                subnets.append((entry['network'], interface));
+
+        subnets.sort(key=lambda subnet: subnet[0].prefixlen, reverse=True);
+
+        with Interfaces.mutex:
+            Interfaces.table = table;
+            Interfaces.broadcast_interfaces = broadcast_interfaces;
+            Interfaces.subnets = subnets;
+            Interfaces.expires = time.monotonic() + Interfaces.TTL;
+
+        return table;
+
+    @staticmethod
+    def get_table():
+        with Interfaces.mutex:
+            if(Interfaces.table is not None and time.monotonic() < Interfaces.expires):
+                return Interfaces.table;
+        return Interfaces.refresh();
 
     @staticmethod
     def get_all_network_interfaces_with_broadcast():
         try:
-            addresses = interfaces();
-            for interface in addresses:
-                config = ifaddresses(interface)
-                # AF_INET is not always present
-                if AF_INET in config.keys():
-                    Interfaces.remove_loopback_from_list(addresses, config, interface);
-
-            #print(addresses);
-            return addresses
+            Interfaces.get_table();
+            return list(Interfaces.broadcast_interfaces);
         except ImportError:
-            return [] 
+            return []
 
     @staticmethod
     def get_broadcast_address(iface_name):
-        addresses = ifaddresses(iface_name);
-        broadcast_list = [];
-        if AF_INET in addresses.keys():
-            for value in addresses[AF_INET]:
-                if('broadcast' in value and len(value['broadcast']) > 0):
-                    return value['broadcast']
-                    #broadcast_list.append(value['broadcast']);
-
-        #return broadcast_list;
-        return None;
+        entry = Interfaces.get_table().get(iface_name);
+        return None if entry is None else entry['broadcast'];
 
     @staticmethod
     def get_local_ip_from_interface(iface_name):
-         addresses = ifaddresses(iface_name);
-         if AF_INET in addresses.keys():
-             for value in addresses[AF_INET]:
-                 if('addr' in value and len(value['addr']) > 0):
-                     return value['addr'];
+        entry = Interfaces.get_table().get(iface_name);
+        return None if entry is None else entry['addr'];
 
-         return None;
+    @staticmethod
+    def get_interface_for_address(ip_address):
+        """Name of the local interface whose subnet contains ip_address, None if there is none"""
+        try:
+            address = ipaddress.IPv4Address(ip_address);
+        except ValueError:
+            return None;
+
+        Interfaces.get_table();
+        for (network, interface) in Interfaces.subnets:
+            if(address in network):
+                return interface;
+        return None;
 
 #ifaces = Interfaces.get_all_network_interfaces_with_broadcast();
 #for iface in ifaces:
@@ -1,22 +1,59 @@
 #!/usr/bin/python3
 
 import threading
+from Base.DeviceQueue import DeviceQueue
 from SQL.Statistics import Statistics;
 
 class DeviceBase(object):
+
+    INITIALIZING = "initializing"
+    READY = "ready"
+    FAILED = "failed"
     
     def __init__(self, enable_statistics=False):
         self.mutex = threading.Lock()
+        self.state = DeviceBase.INITIALIZING
+        self.initialized = threading.Event()
+        #all I/O of a device runs in order on the worker thread of its queue
+        self.queue = DeviceQueue(type(self).__name__)
         if(enable_statistics is True):
-            self.statistics = Statistics();
+            self.statistics = Statistics.shared();
             
         else:
             self.statistics = None;
 
-    def UpdateTable(self, id, action):
+    def UpdateTable(self, id, action, duration=None):
         if(self.statistics is not None):
-            self.statistics.insert(id, action, self.terminalList[action].Value);
+            self.statistics.insert(id, action, self.get_command_value(action), duration);
+
+    def get_command_value(self, action):
+        """Value of an action recorded in the statistics"""
+        return action
     
+    def set_state(self, state):
+        self.state = state
+        if(state != DeviceBase.INITIALIZING):
+            self.initialized.set()
+
+    def wait_ready(self, timeout):
+        """Waits at most timeout seconds for the initialization to finish, True if the device is ready"""
+        self.initialized.wait(timeout)
+        return self.state == DeviceBase.READY
+
+    def status(self):
+        """State of the device reported by the GET request"""
+        status = {'state': self.state}
+        status.update(self.queue.status())
+        return status
+
+    def send_commands(self, commands):
+        """Yields (command, result) for every command, stops after the first failing one"""
+        for command in commands:
+            result = self.send_command(command)
+            yield (command, result)
+            if(result is not True):
+                return
+
     def connect(self):
         pass;
 
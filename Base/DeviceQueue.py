@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+
+import threading
+import time
+import math
+import logging
+from collections import deque
+from concurrent.futures import Future
+from Exception.Exception import QueueFullError, QueueTimeoutError
+
+class DeviceQueue(object):
+    """Bounded FIFO of the work of one device, executed in order by a single worker thread.
+    Work is rejected when the queue is full or when it could not start within max_wait seconds.
+    """
+
+    MAX_DEPTH = 16
+    MAX_WAIT = 30.0
+    #weight of the latest sample in the moving averages
+    SMOOTHING = 0.2
+
+    def __init__(self, name, max_depth=MAX_DEPTH, max_wait=MAX_WAIT):
+        self.name = name
+        self.max_depth = max_depth
+        self.max_wait = max_wait
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.worker = None
+        self.busy = False
+        self.service_time = 0.0
+        self.wait_time = 0.0
+        self.processed = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def configure(self, name, max_depth, max_wait):
+        with self.condition:
+            self.name = name
+            self.max_depth = max_depth
+            self.max_wait = max_wait
+
+    def submit(self, fn, *args, **kwargs):
+        """Queues fn(*args, **kwargs) and returns its Future"""
+        with self.condition:
+            depth = len(self.queue)
+            if(depth >= self.max_depth):
+                self.rejected += 1
+                raise QueueFullError("", "{}: queue is full ({} waiting)".format(self.name, depth), self.__retry_after())
+
+            if(self.processed > 0 and self.__expected_wait() > self.max_wait):
+                self.rejected += 1
+                raise QueueFullError("", "{}: expected wait exceeds {}s".format(self.name, self.max_wait), self.__retry_after())
+
+            future = Future()
+            self.queue.append((future, fn, args, kwargs, time.monotonic()))
+
+            if(self.worker is None):
+                self.worker = threading.Thread(target=self.__run, name="device-" + str(self.name))
+                self.worker.daemon = True
+                self.worker.start()
+
+            self.condition.notify()
+
+        return future
+
+    def status(self):
+        with self.condition:
+            return {
+                'queue_depth': len(self.queue),
+                'busy': self.busy,
+                'max_depth': self.max_depth,
+                'max_wait': self.max_wait,
+                'wait_time': round(self.wait_time, 3),
+                'service_time': round(self.service_time, 3),
+                'processed': self.processed,
+                'rejected': self.rejected,
+                'expired': self.expired
+                }
+
+    def __expected_wait(self):
+        return (len(self.queue) + (1 if self.busy else 0)) * self.service_time
+
+    def __retry_after(self):
+        """Whole seconds until the work queued now would be started"""
+        return max(1, int(math.ceil(self.__expected_wait())))
+
+    def __average(self, average, sample):
+        if(self.processed == 0):
+            return sample
+        return average + self.SMOOTHING * (sample - average)
+
+    def __run(self):
+        while True:
+            with self.condition:
+                while(not self.queue):
+                    self.condition.wait()
+                (future, fn, args, kwargs, enqueued) = self.queue.popleft()
+
+            try:
+                self.__execute(future, fn, args, kwargs, enqueued)
+            except BaseException:
+                #the worker serves the device until the process ends, never let one item stop it
+                logging.exception("{}: queued work failed".format(self.name))
+                with self.condition:
+                    self.busy = False
+
+    def __execute(self, future, fn, args, kwargs, enqueued):
+        if(not future.set_running_or_notify_cancel()):
+            return
+
+        waited = time.monotonic() - enqueued
+        with self.condition:
+            if(waited > self.max_wait):
+                self.expired += 1
+                future.set_exception(QueueTimeoutError("", "{}: waited {:.1f}s in the queue".format(self.name, waited), self.__retry_after()))
+                return
+            self.busy = True
+
+        started = time.monotonic()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+        with self.condition:
+            self.busy = False
+            self.wait_time = self.__average(self.wait_time, waited)
+            self.service_time = self.__average(self.service_time, time.monotonic() - started)
+            self.processed += 1
@@ -0,0 +1,31 @@
+#!/usr/bin/python3
+
+import threading
+from concurrent.futures import Future
+
+def whenAll(futures, render):
+    """Returns a Future which completes with render() once all futures completed"""
+    combined = Future()
+    remaining = [len(futures)]
+    mutex = threading.Lock()
+
+    def complete():
+        try:
+            combined.set_result(render())
+        except Exception as e:
+            combined.set_exception(e)
+
+    def done(future):
+        with mutex:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if(last):
+            complete()
+
+    if(not futures):
+        complete()
+
+    for future in futures:
+        future.add_done_callback(done)
+
+    return combined
@@ -32,4 +32,27 @@ class DestinationNotFoundError(Error):
 class DeviceStateError(Error):
     def __init__(self, expression, message):
         self.expression = expression;
-        self.message = message;
\ No newline at end of file
+        self.message = message;
+
+class QueueFullError(Error):
+    def __init__(self, expression, message, retry_after):
+        self.expression = expression;
+        self.message = message;
+        self.retry_after = retry_after;
+
+class QueueTimeoutError(Error):
+    def __init__(self, expression, message, retry_after):
+        self.expression = expression;
+        self.message = message;
+        self.retry_after = retry_after;
+
+class BusyError(Error):
+    def __init__(self, expression, message, retry_after):
+        self.expression = expression;
+        self.message = message;
+        self.retry_after = retry_after;
+
+class TimingError(Error):
+    def __init__(self, expression, message):
+        self.expression = expression;
+        self.message = message;
@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from Exception.Exception import Error
+
+class Job(object):
+    """A command sequence queued on a device, its state and the result of every command"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, device_id, commands):
+        self.job_id = uuid.uuid4().hex
+        self.device_id = device_id
+        self.commands = commands
+        self.state = Job.QUEUED
+        self.results = []
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+
+    def add_result(self, command, result):
+        self.results.append({'command': command, 'result': result})
+
+    def is_finished(self):
+        return self.state in (Job.DONE, Job.FAILED)
+
+    def to_dict(self):
+        return {
+            'job': self.job_id,
+            'id': self.device_id,
+            'status': self.state,
+            'commands': self.commands,
+            'results': list(self.results),
+            'error': self.error,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished
+            }
+
+class JobManager(object):
+    """Keeps all submitted jobs. Finished jobs are kept until MAX_FINISHED_JOBS newer ones finished"""
+
+    MAX_FINISHED_JOBS = 1000
+    #upper limit of a long poll (seconds)
+    MAX_WAIT = 60.0
+
+    def __init__(self):
+        self.jobs = OrderedDict()
+        self.finished = 0
+        self.mutex = threading.Lock()
+
+    def submit(self, device, device_id, commands, execute):
+        """Queues execute(device, commands, device_id, progress) on the queue of the device"""
+        job = Job(device_id, commands)
+        job.future = device.queue.submit(self.__run, job, execute, device)
+        job.future.add_done_callback(lambda future: self.__expired(job, future))
+
+        with self.mutex:
+            self.jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id):
+        with self.mutex:
+            return self.jobs.get(job_id)
+
+    def __run(self, job, execute, device):
+        job.started = time.time()
+        job.state = Job.RUNNING
+        try:
+            execute(device, job.commands, job.device_id, job.add_result)
+            job.state = Job.DONE
+        except Error as e:
+            job.error = e.message
+            job.state = Job.FAILED
+        except Exception as e:
+            logging.exception("job {} failed".format(job.job_id))
+            job.error = str(e)
+            job.state = Job.FAILED
+        finally:
+            job.finished = time.time()
+            self.__prune()
+
+    def __expired(self, job, future):
+        """A job which never started because it waited too long in the queue"""
+        if(future.exception() is not None and not job.is_finished()):
+            job.error = future.exception().message
+            job.state = Job.FAILED
+            job.finished = time.time()
+            self.__prune()
+
+    def __prune(self):
+        with self.mutex:
+            self.finished += 1
+            while(self.finished > self.MAX_FINISHED_JOBS):
+                for (job_id, job) in self.jobs.items():
+                    if(job.is_finished()):
+                        del self.jobs[job_id]
+                        break
+                self.finished -= 1
@@ -0,0 +1,273 @@
+#!/usr/bin/python3
+
+import threading
+import time
+import queue
+import logging
+from concurrent.futures import Future
+from Exception.Exception import Error, ParseError, TimingError
+
+class Step(object):
+    """Commands for one device, started after the steps it depends on"""
+
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+
+    def __init__(self, name, device_id, device, commands, after, delay, within):
+        self.name = name
+        self.device_id = device_id
+        self.device = device
+        self.commands = commands
+        self.after = after
+        #seconds after the dependencies finished before the step starts
+        self.delay = delay
+        #the step fails without being executed if it can not start within this many seconds
+        self.within = within
+        self.dependents = []
+        self.waiting = len(after)
+        self.state = Step.PENDING
+        self.results = []
+        self.error = None
+        self.ready = None
+        self.started = None
+        self.finished = None
+
+    def add_result(self, command, result):
+        self.results.append({'command': command, 'result': result})
+
+    def to_dict(self, origin):
+        milliseconds = lambda value: None if value is None else round((value - origin) * 1000.0, 3)
+        return {
+            'name': self.name,
+            'id': self.device_id,
+            'status': self.state,
+            'results': list(self.results),
+            'error': self.error,
+            'ready': milliseconds(self.ready),
+            'started': milliseconds(self.started),
+            'finished': milliseconds(self.finished)
+            }
+
+class Transaction(object):
+    """Runs a graph of steps across several devices while holding all of them.
+
+    The queue of every participating device runs a hold task for the duration of the transaction,
+    which executes the steps of its device. The holds of a transaction are queued under one global
+    lock, so all transactions are queued in the same order on every device and can not deadlock.
+    The steps start as soon as all devices are held, timestamps are reported in milliseconds
+    relative to that moment.
+    """
+
+    submit_mutex = threading.Lock()
+
+    def __init__(self, steps, execute):
+        self.steps = steps
+        self.execute = execute
+        self.devices = {}
+        for step in steps:
+            self.devices[step.device_id] = step.device
+        self.channels = {device_id: queue.Queue() for device_id in self.devices}
+        self.future = Future()
+        self.mutex = threading.Lock()
+        self.acquired = 0
+        self.scheduled = 0
+        self.completed = 0
+        self.aborted = False
+        self.closed = False
+        self.error = None
+        self.submitted = time.monotonic()
+        self.origin = None
+
+        names = {step.name: step for step in steps}
+        for step in steps:
+            for name in step.after:
+                names[name].dependents.append(step)
+
+    @staticmethod
+    def parse(request, getDevice):
+        """Builds the steps of a request, getDevice(step) returns (key, device, commands)"""
+        try:
+            entries = request['steps']
+        except (KeyError, TypeError) as e:
+            raise ParseError("", "steps: " + str(e))
+
+        if(not isinstance(entries, list) or not entries):
+            raise ParseError("", "steps must be a non empty list")
+
+        steps = []
+        names = set()
+        #name of the last step of every device
+        previous = {}
+        for (index, entry) in enumerate(entries):
+            if(not isinstance(entry, dict)):
+                raise ParseError("", "step {} must be an object".format(index))
+            (key, device, commands) = getDevice(entry)
+            name = entry.get('name', str(index))
+            after = entry.get('after', [])
+            if(isinstance(after, str)):
+                after = [after]
+
+            if(not isinstance(name, str)):
+                raise ParseError("", "step {}: name must be a string".format(index))
+            if(not isinstance(after, list) or not all(isinstance(dependency, str) for dependency in after)):
+                raise ParseError("", name + ": after must be a step name or a list of step names")
+            if(name in names):
+                raise ParseError("", name + ": step name is not unique")
+            for dependency in after:
+                if(dependency not in names):
+                    #dependencies must be listed before, which also rules out cycles
+                    raise ParseError("", name + ": unknown or later step " + dependency)
+
+            #steps of the same device run in the given order
+            if(key in previous and previous[key] not in after):
+                after = after + [previous[key]]
+            previous[key] = name
+
+            try:
+                delay = float(entry.get('delay_ms', 0)) / 1000.0
+                within = entry.get('within_ms')
+                within = None if within is None else float(within) / 1000.0
+            except (TypeError, ValueError):
+                raise ParseError("", name + ": delay_ms and within_ms must be numbers")
+
+            names.add(name)
+            steps.append(Step(name, key, device, commands, after, delay, within))
+
+        return steps
+
+    def submit(self):
+        """Queues a hold on every device and returns the Future of the transaction result"""
+        holds = []
+        with Transaction.submit_mutex:
+            try:
+                for device_id in sorted(self.devices):
+                    holds.append((device_id, self.devices[device_id].queue.submit(self.__hold, device_id)))
+            except Error:
+                for (device_id, hold) in holds:
+                    if(not hold.cancel()):
+                        self.channels[device_id].put(None)
+                raise
+
+        for (device_id, hold) in holds:
+            hold.add_done_callback(self.__hold_done)
+
+        return self.future
+
+    def __hold(self, device_id):
+        """Runs on the worker thread of the device until the transaction is finished"""
+        with self.mutex:
+            self.acquired += 1
+            start = self.acquired == len(self.devices) and not self.aborted
+            if(start):
+                self.origin = time.monotonic()
+                for step in self.steps:
+                    if(step.waiting == 0):
+                        self.__schedule(step, self.origin)
+
+        channel = self.channels[device_id]
+        while True:
+            work = channel.get()
+            if(work is None):
+                return
+            work()
+
+    def __hold_done(self, hold):
+        """A hold which never started, because it waited too long in the queue"""
+        if(hold.cancelled() or hold.exception() is None):
+            return
+
+        with self.mutex:
+            if(self.error is None):
+                self.error = hold.exception()
+            self.aborted = True
+            finish = self.scheduled == self.completed
+        if(finish):
+            self.__finish()
+
+    def __schedule(self, step, ready):
+        """Hands a step to its device, called with self.mutex held"""
+        step.ready = ready
+        self.scheduled += 1
+        self.channels[step.device_id].put(lambda: self.__run(step))
+
+    def __run(self, step):
+        try:
+            if(self.aborted):
+                step.state = Step.SKIPPED
+                return
+
+            wait = step.ready + step.delay - time.monotonic()
+            if(wait > 0):
+                time.sleep(wait)
+
+            step.started = time.monotonic()
+            if(step.within is not None and step.started - step.ready > step.within):
+                raise TimingError(step.name, "{}: started {:.1f}ms after its dependencies, allowed are {:.1f}ms".format(
+                    step.name, (step.started - step.ready) * 1000.0, step.within * 1000.0))
+
+            self.execute(step.device, step.commands, step.device_id, step.add_result)
+            step.state = Step.DONE
+        except Error as e:
+            step.state = Step.FAILED
+            step.error = e.message
+            self.__fail(e)
+        except Exception as e:
+            logging.exception("transaction step {} failed".format(step.name))
+            step.state = Step.FAILED
+            step.error = str(e)
+            self.__fail(e)
+        finally:
+            step.finished = time.monotonic()
+            self.__completed(step)
+
+    def __fail(self, error):
+        with self.mutex:
+            if(self.error is None):
+                self.error = error
+            self.aborted = True
+
+    def __completed(self, step):
+        with self.mutex:
+            self.completed += 1
+            if(step.state == Step.DONE and not self.aborted):
+                for dependent in step.dependents:
+                    dependent.waiting -= 1
+                    if(dependent.waiting == 0):
+                        self.__schedule(dependent, max(self.__by_name(name).finished for name in dependent.after))
+
+            finish = self.completed == self.scheduled and (self.aborted or self.completed == len(self.steps))
+        if(finish):
+            self.__finish()
+
+    def __by_name(self, name):
+        for step in self.steps:
+            if(step.name == name):
+                return step
+        return None
+
+    def __finish(self):
+        with self.mutex:
+            if(self.closed):
+                return
+            self.closed = True
+
+        for channel in self.channels.values():
+            channel.put(None)
+
+        for step in self.steps:
+            if(step.state == Step.PENDING):
+                step.state = Step.SKIPPED
+
+        if(not self.future.done()):
+            self.future.set_result(self)
+
+    def to_dict(self):
+        origin = self.origin if self.origin is not None else self.submitted
+        return {
+            'status': Step.FAILED if self.error is not None else Step.DONE,
+            'error': None if self.error is None else getattr(self.error, 'message', str(self.error)),
+            'acquired': None if self.origin is None else round((self.origin - self.submitted) * 1000.0, 3),
+            'steps': [step.to_dict(origin) for step in self.steps]
+            }
@@ -28,14 +28,25 @@ __license__ = "MIT"
 
 from Robot.PinRobot import PinRobot;
 from Rest.RestfulThreaded import RESTfulThreadedServer;
+from Rest.RestfulAsync import RESTfulAsyncServer;
 from os.path import join;
 from Parsers.ParseXmlRobotConfiguration import ParseXmlRobotConfiguration, RobotConfiguration;
-from Exception.Exception import Error, ConnectionError, InputError, ParseError, DestinationNotFoundError, DeviceStateError;
+from Exception.Exception import Error, ConnectionError, InputError, ParseError, DestinationNotFoundError, DeviceStateError, NotImplementedError, BusyError;
 import json;
 import argparse;
+from urllib.parse import urlsplit, parse_qs;
+from http import HTTPStatus;
+from Rest.RestHandler import RestResponse, LongPoll, getErrorStatus;
+from Jobs.JobManager import JobManager;
+from Jobs.Transaction import Transaction;
+from Base.DeviceQueue import DeviceQueue;
+from Base.Futures import whenAll;
 from SQL.Statistics import Statistics;
 import logging;
 import traceback;
+import time;
+import threading;
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED;
 from AxHw.CardMultiplexer import CardMultiplexer;
 from AxHw.CardMagstriper import CardMagstriper;
 
@@ -46,6 +57,9 @@ __minor__ = 5
 __service__ = 0
 __build__ = 51
 __path = "ConfigRest"
+__jobs = JobManager()
+#seconds a request waits for a device which is still initializing, 0 fails immediately
+__init_wait = 0.0
 
 __intro__= (
     "AX Robot Integration Layer\n"
@@ -57,6 +71,7 @@ __intro__= (
 #----------------------------------------------------------------------------------------------------------------#
 
 def main():
+    global __init_wait
 
     args = EnableAndParseArguments()
   
@@ -65,6 +80,14 @@ def main():
         
     enable_statistics=args.enable_statistics
     empower = args.empower_card
+    pipeline_depth = int(args.pipeline_depth)
+    server_mode = args.server
+    workers = int(args.workers)
+    max_queue_depth = int(args.max_queue_depth)
+    max_queue_wait = float(args.max_queue_wait)
+    init_workers = int(args.init_workers)
+    init_timeout = float(args.init_timeout)
+    __init_wait = float(args.init_wait)
 
     SetLoggingLevel(args)
 
@@ -75,47 +98,30 @@ def main():
     try:
         (robot_conf_list, mux_conf_list, mag_conf_list) = ParseXmlRobotConfiguration.parseXml(config)
 
-        device_list = {}
-        error = 0
+        tasks = []
 
         for key, robotConfiguration in robot_conf_list.items():
-             try:
-                robot = PinRobot(enable_statistics, empower)
-
-                if(False is RobotInitialisation(robot, robotConfiguration)):
-                    error += 1
-                    continue
-
-                device_list.update({key: robot})
-             except DeviceStateError:
-                pass;
-
+            robot = PinRobot(enable_statistics, empower, pipeline_depth)
+            tasks.append((key, robot, RobotInitialisation, robotConfiguration))
 
         for key, mux_configuration in mux_conf_list.items():
             mux = CardMultiplexer(mux_configuration.mac_address, enable_statistics)
-
-            if(False is MuxInitialization(mux, mux_configuration)):
-                error += 1
-                continue
-
-            device_list.update({key: mux})
+            tasks.append((key, mux, MuxInitialization, mux_configuration))
 
         for key, mag_configuration in mag_conf_list.items():
             mag = CardMagstriper(mag_configuration.mac_address, enable_statistics)
+            tasks.append((key, mag, MagInitialization, mag_configuration))
 
-            if(False is MagInitialization(mag, mag_configuration)):
-                error += 1
-                continue
-
-            device_list.update({key: mag})
-
-        if(not device_list):
+        if(not tasks):
             logging.critical("Fatal error, device list is empty!");
             raise Error("", "Fatal error, device list is empty!");
 
-        logging.info("Initialization success! Warnings: {}".format(error))
+        device_list = InitializeDevices(tasks, init_workers, init_timeout)
 
-        StartRestServer(doPostWork, doGetWork, device_list, port)
+        for key, device in device_list.items():
+            device.queue.configure(key, max_queue_depth, max_queue_wait)
+
+        StartRestServer(doPostWork, doGetWork, device_list, port, server_mode, workers)
 
     except Error as e:
         traceback.print_exc()
@@ -142,11 +148,88 @@ def EnableAndParseArguments():
     parser.add_argument("-v", "--verbose", nargs='?', const=True, default=False, help="increase trace verbosity to the INFO level", required=False)
     parser.add_argument("-d", "--debug", nargs='?', const=True, default=False, help="increase trace verbosity to the DEBUG level", required=False)
     parser.add_argument("--empower-card", nargs='?', const=True, default=False, help="increase the current on the card for the terminals with tighter card reader", required=False)
+    parser.add_argument("--server", default="threaded", choices=["threaded", "async"], help="threaded: one thread per connection, async: asyncio event loop workers", required=False)
+    parser.add_argument("--workers", default='1', help="number of event loop workers of the async server, default is 1", required=False)
+    parser.add_argument("--max-queue-depth", default=str(DeviceQueue.MAX_DEPTH), help="requests waiting per device before further requests are rejected with 429", required=False)
+    parser.add_argument("--max-queue-wait", default=str(DeviceQueue.MAX_WAIT), help="seconds a request may wait for its device before it is rejected", required=False)
+    parser.add_argument("--init-workers", default='8', help="number of devices initialized concurrently at startup, default is 8", required=False)
+    parser.add_argument("--init-timeout", default='120', help="seconds the initialization of a single device may take, default is 120", required=False)
+    parser.add_argument("--init-wait", default='0', help="seconds a request waits for a device which is still initializing, 0 rejects it immediately", required=False)
+    parser.add_argument("--pipeline-depth", default=str(PinRobot.PIPELINE_DEPTH), help="number of G-code lines streamed to a robot before waiting for its acknowledgement, 1 disables pipelining", required=False)
 
     return parser.parse_args()
 
 #------------------------------------------------------------------------------------------------------------------------#
 
+def InitializeDevices(tasks, workers, timeout):
+    """Starts the (key, device, initialization, configuration) tasks on 'workers' threads in the background.
+    Returns all devices right away, their state tells whether the initialization finished.
+    A device which is not initialized 'timeout' seconds after its initialization started fails
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="init")
+    started = {}
+    device_list = {}
+
+    def initialize(key, device, initialization, configuration):
+        started[key] = time.monotonic()
+        return initialization(device, configuration)
+
+    futures = {}
+    for task in tasks:
+        device_list.update({task[0]: task[1]})
+        futures[executor.submit(initialize, *task)] = task
+
+    monitor = threading.Thread(target=MonitorInitialization, args=(executor, futures, started, timeout), name="init-monitor")
+    monitor.daemon = True
+    monitor.start()
+
+    return device_list
+
+#------------------------------------------------------------------------------------------------------------------------#
+
+def MonitorInitialization(executor, futures, started, timeout):
+    """Sets the state of every device once its initialization finished or timed out and prints a summary"""
+    summary = {}
+    pending = set(futures)
+
+    while(pending):
+        (done, pending) = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+        now = time.monotonic()
+
+        for future in done:
+            (key, device, initialization, configuration) = futures[future]
+            latency = now - started[key]
+            try:
+                if(False is future.result()):
+                    device.set_state(device.FAILED)
+                else:
+                    device.set_state(device.READY)
+            except Exception as e:
+                logging.error("{}: initialization failed: {}".format(key, getattr(e, 'message', e)))
+                device.set_state(device.FAILED)
+            summary[key] = (device.state, latency)
+
+        for future in list(pending):
+            (key, device, initialization, configuration) = futures[future]
+            if(key in started and now - started[key] > timeout):
+                logging.error("{}: initialization timed out after {}s".format(key, timeout))
+                device.set_state(device.FAILED)
+                summary[key] = ("timeout", now - started[key])
+                pending.remove(future)
+
+    #threads of timed out initializations are left behind
+    executor.shutdown(wait=False)
+
+    print("Initialization finished:")
+    for (key, device, initialization, configuration) in futures.values():
+        (state, latency) = summary[key]
+        print("  {:<30} {:<12} {:8.2f}s".format(key, state, latency))
+
+    failed = len([key for key in summary if summary[key][0] != "ready"])
+    logging.info("Initialization finished! Warnings: {}".format(failed))
+
+#------------------------------------------------------------------------------------------------------------------------#
+
 def MuxInitialization(mux : CardMultiplexer, configuration):
     if(False is mux.device_lookup()):
         return False
@@ -182,43 +265,60 @@ def RobotInitialisation(robot : PinRobot, configuration):
 
         if (False is robot.send_command("HOME")):
             logging.warning(configuration.Layout + ": robot calibration could not be executed")
+            robot.close_connection()
             return False;
 
-    finally:
+    except Exception:
         robot.close_connection()
+        raise
 
+    #the connection stays open and is reused by the following requests
     return True
 
 #---------------------------------------------------------------------------------------------------------------#
 
-def StartRestServer(postWork, getWork, robotList, port):
-    server = RESTfulThreadedServer(postWork, getWork, robotList, port)
+def StartRestServer(postWork, getWork, robotList, port, server_mode="threaded", workers=1):
+    if(server_mode == "async"):
+        server = RESTfulAsyncServer(postWork, getWork, robotList, port, workers)
+    else:
+        server = RESTfulThreadedServer(postWork, getWork, robotList, port)
     server.start()
     server.waitForThread()
 
 #---------------------------------------------------------------------------------------------------------------#
 
-def executeCommands(device, commands, key):
+def executeCommands(device, commands, key, progress=None):
     """Execute a request, protected by a lock. Every request on a single robot 
-    must be processed till the end before the next may be processed
+    must be processed till the end before the next may be processed.
+    The device connection is kept open between requests, device.connect() 
+    only reconnects if the previous connection was lost or went idle.
+    progress(command, result) is called after every command
     """
     try:
         device.mutex.acquire()
 
+        if(False is device.wait_ready(__init_wait)):
+            raise ConnectionError("", "{}: device is {}".format(key, device.state))
+
         if(False is device.connect()):
             logging.error("robot '{}' is unreachable".format(key))
             raise ConnectionError("", "could not connect to the robot: " + key)
 
-        for command in commands:
-            if(True is device.send_command(command)):
+        started = time.monotonic()
+        for (command, result) in device.send_commands(commands):
+            finished = time.monotonic()
+            if(progress is not None):
+                progress(command, result)
+
+            if(True is result):
                 logging.info("{}: execution of {} was succesful".format(key, command))
-                device.UpdateTable(key, command)
+                device.UpdateTable(key, command, finished - started)
+                started = finished
             else:
                 logging.warning("could not execute '{}' on {}. Abort further execution".format(command, key))
-                raise InputError("", key + ": could not execute: " + command)
+                raise InputError("", "{}: could not execute: {}".format(key, command))
 
     finally:
-        device.close_connection()
         device.mutex.release()
 
 #-----------------------------------------------------------------------------------------------------------------#
@@ -234,28 +334,195 @@ def getRequest(jsonString):
 
 #----------------------------------------------------------------------------------------------------------------#   
 
-def doPostWork(jsonString, robotList):
-    
-    request = getRequest(jsonString)
+def getDevice(request, robotList):
     try:
         key = request['id']
+        commands = request['commands']
+    except (KeyError, TypeError) as e:
+        raise ParseError("", str(e));
 
-        if(key not in robotList):
-            logging.error("robot {} not in list".format(key))
-            raise DestinationNotFoundError("" , key + ": robot not found")
+    if(not isinstance(key, str)):
+        raise ParseError("", "id must be a string");
+    if(not isinstance(commands, list)):
+        raise ParseError("", key + ": commands must be a list");
 
-        executeCommands(robotList[key], request['commands'], key)
-    except KeyError as e:
-        raise ParseError("", str(e));
-    return True
+    if(key not in robotList):
+        logging.error("robot {} not in list".format(key))
+        raise DestinationNotFoundError("" , key + ": robot not found")
+
+    device = robotList[key]
+    if(device.state == device.FAILED or (device.state == device.INITIALIZING and __init_wait <= 0)):
+        raise ConnectionError("", "{}: device is {}".format(key, device.state))
+
+    return (key, device, commands)
+
+#----------------------------------------------------------------------------------------------------------------#   
+
+def getPath(path):
+    url = urlsplit(path)
+    return ([part for part in url.path.split('/') if part], parse_qs(url.query))
+
+#----------------------------------------------------------------------------------------------------------------#   
+
+def doPostWork(jsonString, robotList, path="/"):
+    """Validates the request and queues it on the device.
+    Returns the Future of the execution, POST /jobs returns the queued job instead
+    """
+    request = getRequest(jsonString)
+    (parts, query) = getPath(path)
+    if(parts == ['batch']):
+        return submitBatch(request, robotList)
+
+    if(parts == ['transactions']):
+        return submitTransaction(request, robotList)
+
+    (key, device, commands) = getDevice(request, robotList)
+
+    if(parts == ['jobs']):
+        job = __jobs.submit(device, key, commands, executeCommands)
+        return RestResponse(HTTPStatus.ACCEPTED, json.dumps(job.to_dict()), {'Location': '/jobs/' + job.job_id})
+
+    return device.queue.submit(executeCommands, device, commands, key)
+
+#----------------------------------------------------------------------------------------------------------------#
+
+def submitBatch(request, robotList):
+    """POST /batch runs the command lists of several devices concurrently, every device in its own order.
+    Lists for the same device are executed as one sequence. Returns the Future of the combined result
+    """
+    try:
+        entries = request['batch']
+    except (KeyError, TypeError) as e:
+        raise ParseError("", "batch: " + str(e));
+
+    if(not isinstance(entries, list)):
+        raise ParseError("", "batch must be a list of requests");
+
+    sequences = {}
+    for entry in entries:
+        (key, device, commands) = getDevice(entry, robotList)
+        if(key not in sequences):
+            sequences[key] = (device, [])
+        sequences[key][1].extend(commands)
+
+    results = {}
+    futures = []
+    for (key, (device, commands)) in sequences.items():
+        result = {'id': key, 'status': 'done', 'results': [], 'error': None}
+        results[key] = result
+        progress = lambda command, value, result=result: result['results'].append({'command': command, 'result': value})
+        try:
+            future = device.queue.submit(executeCommands, device, commands, key, progress)
+            future.add_done_callback(lambda future, result=result: batchDone(future, result))
+            futures.append(future)
+        except Error as e:
+            batchFailed(result, e)
+
+    return whenAll(futures, lambda: batchResponse(list(results.values())))
+
+def batchDone(future, result):
+    if(future.exception() is not None):
+        batchFailed(result, future.exception())
+
+def batchFailed(result, error):
+    result['status'] = 'failed'
+    result['error'] = getattr(error, 'message', str(error))
+    result['exception'] = error
+
+def batchResponse(results):
+    """200 if every device succeeded, otherwise the status of the first failure"""
+    code = HTTPStatus.OK
+    for result in results:
+        error = result.pop('exception', None)
+        if(error is not None and code == HTTPStatus.OK):
+            code = getErrorStatus(error)
+
+    return RestResponse(code, json.dumps({'batch': results}))
+
+#----------------------------------------------------------------------------------------------------------------#
+
+def submitTransaction(request, robotList):
+    """POST /transactions runs a graph of steps on several devices while holding all of them.
+    Returns the Future of the transaction result with the timestamps of every step
+    """
+    steps = Transaction.parse(request, lambda entry: getDevice(entry, robotList))
+    transaction = Transaction(steps, executeCommands)
+    future = transaction.submit()
+
+    return whenAll([future], lambda: transactionResponse(transaction))
+
+def transactionResponse(transaction):
+    code = HTTPStatus.OK if transaction.error is None else getErrorStatus(transaction.error)
+    return RestResponse(code, json.dumps({'transaction': transaction.to_dict()}))
+
+#----------------------------------------------------------------------------------------------------------------#
+
+def getJob(job_id, query):
+    """GET /jobs/<id>?wait=<seconds> waits until the job finished or the wait time expired"""
+    job = __jobs.get(job_id)
+    if(job is None):
+        raise InputError("", job_id + ": job not found")
+
+    try:
+        wait = min(float(query.get('wait', ['0'])[0]), JobManager.MAX_WAIT)
+    except ValueError:
+        raise ParseError("", "wait must be a number of seconds")
+
+    render = lambda: json.dumps(job.to_dict())
+    if(wait > 0 and not job.is_finished()):
+        return LongPoll(job.future, wait, render)
+
+    return render()
 
 #----------------------------------------------------------------------------------------------------------------#
         
-def doGetWork(robotList):
-    l = list(robotList.keys())
-    robot_object = {'id' : l}
+def getStatistics(report, query):
+    """GET /statistics/<report>?robot=<id>&command=<id>&from=<time>&to=<time>&bucket=<hour|day|month>"""
+    statistics = Statistics.shared_instance
+    if(statistics is None):
+        raise NotImplementedError("", "statistics are disabled, start with --enable-statistics")
+
+    if(report is None):
+        return json.dumps(statistics.status())
+
+    parameter = lambda name, default=None: query.get(name, [default])[0]
+    (robot_id, start, end) = (parameter('robot'), parameter('from'), parameter('to'))
+
+    bucket = parameter('bucket', 'hour')
+    if(bucket not in Statistics.BUCKETS):
+        raise ParseError("", "bucket must be one of " + ", ".join(Statistics.BUCKETS))
+
+    if(report == 'presses'):
+        future = statistics.presses(robot_id, start, end, bucket)
+    elif(report == 'commands'):
+        future = statistics.commands(robot_id, start, end)
+    elif(report == 'latency'):
+        future = statistics.latency(robot_id, start, end, parameter('command'), bucket=bucket)
+    else:
+        raise InputError("", report + ": unknown statistics")
+
+    return LongPoll(future, Statistics.QUERY_TIMEOUT, lambda: statisticsResponse(report, future))
+
+def statisticsResponse(report, future):
+    if(not future.done()):
+        raise BusyError("", "{}: statistics did not answer within {}s".format(report, Statistics.QUERY_TIMEOUT), 1)
+    return json.dumps({report: future.result()})
+
+#----------------------------------------------------------------------------------------------------------------#
+        
+def doGetWork(robotList, path="/"):
+    (parts, query) = getPath(path)
+    if(len(parts) == 2 and parts[0] == 'jobs'):
+        return getJob(parts[1], query)
+
+    if(len(parts) in (1, 2) and parts[0] == 'statistics'):
+        return getStatistics(parts[1] if len(parts) == 2 else None, query)
+
+    l = [key for (key, device) in robotList.items() if device.state == device.READY]
+    robot_object = {'id' : l, 'devices' : {key: device.status() for (key, device) in robotList.items()}}
     return json.dumps(robot_object)
 
 #----------------------------------------------------------------------------------------------------------------#
 
-main()
+if __name__ == '__main__':
+    main()
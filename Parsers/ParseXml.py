@@ -3,6 +3,10 @@
 from xml.dom.minidom import parse
 import xml.dom.minidom
 import logging
+from Exception.Exception import ParseError
+from UDPMessage.AxUDPMessage import AxUDPMessage
+from UDPMessage.AxUDPCardMagstriperCommand import AxUDPCardMagstriperCommand
+from UDPMessage.UDPMagics import UDPMagics
 
 class Terminal(object):
 
@@ -17,6 +21,42 @@ class MultiplexerComand(object):
         self.CanonicalName = CanonicalName
         self.Value = Value
 
+class MagstripeTrack(object):
+    """Track data checked against the character set of its track and compiled into the frame loading it"""
+
+    #command, first and last character, maximal length
+    FORMATS = {
+        1: (AxUDPCardMagstriperCommand.SetTrack1, 0x20, 0x5F, 79),
+        2: (AxUDPCardMagstriperCommand.SetTrack2, 0x30, 0x3F, 40),
+        3: (AxUDPCardMagstriperCommand.SetTrack3, 0x30, 0x3F, 107)
+        }
+
+    def __init__(self, number, value):
+        (self.command, first, last, max_length) = MagstripeTrack.FORMATS[number]
+        self.value = value
+
+        if(len(value) > max_length):
+            raise ParseError(value, "Track{} is {} characters long, allowed are {}".format(number, len(value), max_length))
+
+        for character in value:
+            if(ord(character) < first or ord(character) > last):
+                raise ParseError(value, "Track{} contains the invalid character {!r}".format(number, character))
+
+        characters = value.encode('ascii')
+
+        #track1 is sent as 6 bit values, reduce all characters by 0x20
+        self.data = bytes(character - 0x20 for character in characters) if number == 1 else characters
+        self.lrc = MagstripeTrack.lrc(characters, first)
+        self.frame = bytes(AxUDPMessage(UDPMagics.CardMagstriperMagic, int(self.command), self.data).get_bytes())
+
+    @staticmethod
+    def lrc(characters, first):
+        """Longitudinal redundancy check character of the track, the XOR of all data bits"""
+        lrc = 0
+        for character in characters:
+            lrc ^= character - first
+        return chr(lrc + first)
+
 class MagstripeComand(object):
 
     def __init__(self, CanonicalName, Brand, Track1, Track2, Track3):
@@ -25,6 +65,13 @@ class MagstripeComand(object):
         self.Track1 = Track1
         self.Track2 = Track2
         self.Track3 = Track3
+
+        #compiled tracks by command
+        self.tracks = {}
+        for (number, value) in ((1, Track1), (2, Track2), (3, Track3)):
+            if(value is not None):
+                track = MagstripeTrack(number, value)
+                self.tracks[track.command] = track
         
 class XmlParser(object):
 
@@ -123,7 +170,12 @@ class XmlParser(object):
            if Track3.childNodes:
                track3_data = Track3.childNodes[0].data;
 
-           magComand = MagstripeComand(canonical_data, brand_data, track1_data, track2_data, track3_data)
+           try:
+               magComand = MagstripeComand(canonical_data, brand_data, track1_data, track2_data, track3_data)
+           except ParseError as e:
+               logging.error("Magstriper: {}: {}".format(canonical_data, e.message))
+               return None
+
            comandList.update({Canonical.childNodes[0].data: magComand})
 
         return comandList
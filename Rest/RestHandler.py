@@ -1,57 +1,134 @@
 #!/usr/bin/python3
 
 from http.server import BaseHTTPRequestHandler
-from Exception.Exception import NotImplementedError, ParseError, InputError, ConnectionError, DestinationNotFoundError, Error
+from Exception.Exception import NotImplementedError, ParseError, InputError, ConnectionError, DestinationNotFoundError, QueueFullError, QueueTimeoutError, BusyError, TimingError, Error
 from http import HTTPStatus
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 import logging
 
+#Persistent connections are closed after being idle or serving this many requests
+KEEP_ALIVE_TIMEOUT = 30.0
+MAX_KEEP_ALIVE_REQUESTS = 1000
+
+#Maps the errors raised by the post/get work to the returned status, first match wins
+ERROR_STATUS = [
+    (NotImplementedError, HTTPStatus.NOT_IMPLEMENTED),
+    (QueueFullError, HTTPStatus.TOO_MANY_REQUESTS),
+    ((QueueTimeoutError, BusyError), HTTPStatus.SERVICE_UNAVAILABLE),
+    (TimingError, HTTPStatus.CONFLICT),
+    ((ConnectionError, DestinationNotFoundError), HTTPStatus.SERVICE_UNAVAILABLE),
+    (ParseError, HTTPStatus.BAD_REQUEST),
+    (InputError, HTTPStatus.NOT_FOUND),
+    (Error, HTTPStatus.METHOD_NOT_ALLOWED),
+    ]
+
+def getErrorStatus(error):
+    for (errors, status) in ERROR_STATUS:
+        if(isinstance(error, errors)):
+            return status
+    return HTTPStatus.INTERNAL_SERVER_ERROR
+
+class RestResponse(object):
+    """Returned by the post/get work when the response is more than an empty 200"""
+    def __init__(self, code=HTTPStatus.OK, body=None, headers=None):
+        self.code = code
+        self.body = body
+        self.headers = headers or {}
+
+class LongPoll(object):
+    """Returned by the post/get work to wait for a future at most 'timeout' seconds.
+    render() creates the result once the future completed or the timeout expired
+    """
+    def __init__(self, future, timeout, render):
+        self.future = future
+        self.timeout = timeout
+        self.render = render
+
+def getErrorHeaders(error):
+    """Errors of a busy device tell the client when to retry"""
+    if(hasattr(error, 'retry_after')):
+        return {'Retry-After': str(error.retry_after)}
+    return {}
+
+def getResult(result):
+    """The post/get work may return a Future when the work is queued on a device"""
+    if(isinstance(result, LongPoll)):
+        try:
+            result.future.result(result.timeout)
+        except FutureTimeoutError:
+            pass
+        return result.render()
+    if(isinstance(result, Future)):
+        return result.result()
+    return result
+
+def getResponse(result):
+    if(isinstance(result, RestResponse)):
+        return result
+    if(isinstance(result, str)):
+        return RestResponse(HTTPStatus.OK, result)
+    return RestResponse()
+
 class HandleRestRequest(BaseHTTPRequestHandler):
-    def __sendResponse(s, code, message=None):
+    protocol_version = "HTTP/1.1"
+    #idle timeout of a persistent connection
+    timeout = KEEP_ALIVE_TIMEOUT
+    #header and body are written separately, do not let Nagle delay the body
+    disable_nagle_algorithm = True
+
+    def __sendResponse(s, code, message=None, body=None, headers=None):
+        headers = headers or {}
+        data = b'' if body is None else (body + "\r\n").encode('utf-8')
+        s.requests += 1
+
         s.send_response(code, message)
         s.send_header('Content-Type', 'application/json')
-        s.send_header("Connection", "close")
+        s.send_header('Content-Length', str(len(data)))
+        for (name, value) in headers.items():
+            s.send_header(name, value)
+        if(s.close_connection or s.requests >= MAX_KEEP_ALIVE_REQUESTS):
+            s.send_header("Connection", "close")
+        else:
+            s.send_header("Connection", "keep-alive")
+            s.send_header("Keep-Alive", "timeout={}, max={}".format(int(KEEP_ALIVE_TIMEOUT), MAX_KEEP_ALIVE_REQUESTS - s.requests))
         s.end_headers()
+        if(data and s.command != 'HEAD'):
+            s.wfile.write(data)
 
     def __doGetWork(s):
         try:
-            result = s.getProcess(s.processArg)
+            response = getResponse(getResult(s.getProcess(s.processArg, s.path)))
 
-            s.__sendResponse(HTTPStatus.OK)
-            s.wfile.write(result.encode('utf-8'))
-            s.wfile.write("\r\n".encode('utf-8'))
+            s.__sendResponse(response.code, body=response.body, headers=response.headers)
         except NotImplementedError:
             s.__sendResponse(HTTPStatus.NOT_IMPLEMENTED, "not implemented")
             pass
+        except Error as error:
+            s.__sendResponse(getErrorStatus(error), error, headers=getErrorHeaders(error));
+            pass
         except:
             s.__sendResponse(HTTPStatus.METHOD_NOT_ALLOWED)
             pass
 
     def __doPOSTWork(s):
-        length = int(s.headers["Content-Length"])
-        ctype = s.headers["Content-Type"]
+        length = int(s.headers.get("Content-Length", 0))
+        ctype = s.headers.get("Content-Type", "")
 
         try:
+            #always consume the body, the connection may carry further requests
+            payload = str(s.rfile.read(length), 'utf-8')
+
             if("application/json" not in ctype):
-                raise ParseError
+                raise ParseError("", "content type must be application/json")
 
-            payload = str(s.rfile.read(length), 'utf-8')
-            s.postProcess(payload, s.processArg)
+            response = getResponse(getResult(s.postProcess(payload, s.processArg, s.path)))
                 
-            s.__sendResponse(HTTPStatus.OK)
+            s.__sendResponse(response.code, body=response.body, headers=response.headers)
         except NotImplementedError:
             s.__sendResponse(HTTPStatus.NOT_IMPLEMENTED, "not implemented")
             pass
-        except (ConnectionError, DestinationNotFoundError) as error:
-            s.__sendResponse(HTTPStatus.SERVICE_UNAVAILABLE, error);
-            pass
-        except (ParseError) as error:
-            s.__sendResponse(HTTPStatus.BAD_REQUEST, error);
-            pass
-        except InputError as error:
-            s.__sendResponse(HTTPStatus.NOT_FOUND, error);
-            pass;
         except Error as error:
-            s.__sendResponse(HTTPStatus.METHOD_NOT_ALLOWED, error);
+            s.__sendResponse(getErrorStatus(error), error, headers=getErrorHeaders(error));
             pass
 
         
@@ -64,6 +141,7 @@ class HandleRestRequest(BaseHTTPRequestHandler):
         s.postProcess = functionPost
         s.getProcess = functionGet
         s.processArg = argument
+        s.requests = 0
         BaseHTTPRequestHandler.__init__(s, *args)
         
     def do_HEAD(s):
@@ -0,0 +1,176 @@
+#!/usr/bin/python3
+
+import asyncio
+import socket
+import threading
+import logging
+from concurrent.futures import Future
+from http import HTTPStatus
+from Rest.RestHandler import getErrorStatus, getErrorHeaders, getResponse, RestResponse, LongPoll, KEEP_ALIVE_TIMEOUT, MAX_KEEP_ALIVE_REQUESTS
+from Exception.Exception import NotImplementedError, ParseError, Error
+
+class AsyncRequestHandler():
+    """Serves the GET/POST contract of HandleRestRequest on an asyncio event loop.
+    Waiting clients are coroutines, device work runs on the queue of the device.
+    """
+
+    MAX_HEADERS = 100
+
+    def __init__(s, functionPost, functionGet, argument):
+        s.postProcess = functionPost
+        s.getProcess = functionGet
+        s.processArg = argument
+
+    async def handle(s, reader, writer):
+        try:
+            for requests in range(1, MAX_KEEP_ALIVE_REQUESTS + 1):
+                try:
+                    request = await asyncio.wait_for(s.__readRequest(reader), KEEP_ALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+
+                if(request is None):
+                    break
+
+                (method, path, version, headers, body) = request
+                keep_alive = s.__keepAlive(version, headers) and requests < MAX_KEEP_ALIVE_REQUESTS
+
+                response = await s.__process(method, path, headers, body)
+                await s.__sendResponse(writer, response, keep_alive, requests, method == 'HEAD')
+                logging.info('"%s %s %s" %s', method, path, version, int(response.code))
+
+                if(not keep_alive):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def __keepAlive(s, version, headers):
+        connection = headers.get('connection', '').lower()
+        if(version == 'HTTP/1.1'):
+            return connection != 'close'
+        return connection == 'keep-alive'
+
+    async def __readRequest(s, reader):
+        line = await reader.readline()
+        words = line.decode('iso-8859-1').split()
+        if(len(words) != 3):
+            return None
+
+        (method, path, version) = words
+        headers = {}
+        for i in range(s.MAX_HEADERS):
+            line = await reader.readline()
+            if(line in (b'\r\n', b'\n', b'')):
+                break
+            (name, separator, value) = line.decode('iso-8859-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        body = b''
+        length = int(headers.get('content-length', 0))
+        if(length > 0):
+            body = await reader.readexactly(length)
+
+        return (method, path, version, headers, body)
+
+    async def __process(s, method, path, headers, body):
+        try:
+            if(method == 'GET'):
+                return getResponse(await s.__await(s.getProcess(s.processArg, path)))
+
+            if(method == 'HEAD'):
+                return RestResponse()
+
+            if(method == 'POST'):
+                if("application/json" not in headers.get('content-type', '')):
+                    raise ParseError("", "content type must be application/json")
+
+                return getResponse(await s.__await(s.postProcess(str(body, 'utf-8'), s.processArg, path)))
+
+            return RestResponse(HTTPStatus.NOT_IMPLEMENTED)
+        except NotImplementedError:
+            return RestResponse(HTTPStatus.NOT_IMPLEMENTED)
+        except Error as error:
+            return RestResponse(getErrorStatus(error), headers=getErrorHeaders(error))
+        except Exception:
+            logging.exception("request failed")
+            return RestResponse(HTTPStatus.INTERNAL_SERVER_ERROR)
+
+    async def __await(s, result):
+        if(isinstance(result, LongPoll)):
+            try:
+                await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(result.future)), result.timeout)
+            except asyncio.TimeoutError:
+                pass
+            return result.render()
+        if(isinstance(result, Future)):
+            return await asyncio.wrap_future(result)
+        return result
+
+    async def __sendResponse(s, writer, response, keep_alive, requests, head=False):
+        data = b'' if response.body is None else (response.body + "\r\n").encode('utf-8')
+        if(keep_alive):
+            connection = "Connection: keep-alive\r\nKeep-Alive: timeout={}, max={}\r\n".format(int(KEEP_ALIVE_TIMEOUT), MAX_KEEP_ALIVE_REQUESTS - requests)
+        else:
+            connection = "Connection: close\r\n"
+
+        header = (
+            "HTTP/1.1 {} {}\r\n"
+            "Content-Type: application/json\r\n"
+            "Content-Length: {}\r\n"
+            "{}"
+            "{}"
+            "\r\n"
+            ).format(response.code.value, response.code.phrase, len(data), 
+                     "".join("{}: {}\r\n".format(name, value) for (name, value) in response.headers.items()), connection)
+        writer.write(header.encode('iso-8859-1') + (b'' if head else data))
+        await writer.drain()
+
+class RESTfulAsyncServer():
+    """REST server running a fixed number of event loop threads on one listening socket.
+    The thread count does not grow with the number of waiting clients.
+    """
+
+    def __init__(s, functionPost, functionGet, argument, port=8000, workers=1):
+        s.handler = AsyncRequestHandler(functionPost, functionGet, argument)
+        s.port = port
+        s.workers = max(1, workers)
+        s.loops = []
+        s.threads = []
+
+        s.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.socket.bind(('', port))
+        s.socket.listen(socket.SOMAXCONN)
+
+    def __serve(s, loop, sock):
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(asyncio.start_server(s.handler.handle, sock=sock))
+        try:
+            loop.run_forever()
+        finally:
+            server.close()
+            loop.run_until_complete(server.wait_closed())
+            loop.close()
+
+    def start(s):
+        for i in range(s.workers):
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=s.__serve, args=(loop, s.socket.dup()), name="rest-worker-{}".format(i))
+            thread.daemon = True
+            s.loops.append(loop)
+            s.threads.append(thread)
+            thread.start()
+
+        print("Listening at port " + str(s.port) + " (" + str(s.workers) + " async workers)")
+
+    def waitForThread(s):
+        for thread in s.threads:
+            thread.join()
+
+    def shutdown(s):
+        for loop in s.loops:
+            loop.call_soon_threadsafe(loop.stop)
+        s.waitForThread()
+        s.socket.close()
@@ -5,6 +5,7 @@ from socket import timeout as SocketTimeout;
 from socket import error as SocketError;
 import errno;
 import logging;
+import time;
 
 class PEMSocket(object):
      
@@ -13,55 +14,129 @@ class PEMSocket(object):
     def __init__(self, IP, Port):
         self.IP = IP
         self.Port = Port
+        self.Connection = None
+        self.last_activity = 0.0
+        self.chunk = bytearray(self.BUFFER_SIZE)
+        self.chunk_view = memoryview(self.chunk)
+        self.__reset_buffer()
+
+    def __reset_buffer(self):
+        #received bytes, complete lines are consumed from 'start'
+        self.buffer = bytearray()
+        self.start = 0
+        #offset up to which the buffer is known to contain no line feed
+        self.scan = 0
 
     def connect(self):
+        self.__reset_buffer()
         try:
             self.Connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.Connection.connect((self.IP, self.Port)) 
             self.Connection.settimeout(10.0)
+            self.Connection.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            self.Connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         except SocketError as e:
             logging.error("could not connect({}) to {}:{}. Socket already in use".format(str(e.errno), self.IP, self.Port))
+            self.Connection = None
             return False
         except Exception as e:
             logging.error("could not connect({}) to {}:{}".format(str(e.errno), self.IP, self.Port))
+            self.Connection = None
             return False;
 
-        
+        self.last_activity = time.monotonic()
         return True
 
+    def is_connected(self):
+        """Checks without blocking whether the peer still holds the connection open"""
+        if(self.Connection is None):
+            return False
+
+        try:
+            self.Connection.setblocking(False)
+            data = self.Connection.recv(1, socket.MSG_PEEK)
+            #an orderly shutdown of the peer is signaled by an empty read
+            return len(data) > 0
+        except BlockingIOError:
+            return True
+        except SocketError:
+            return False
+        finally:
+            self.Connection.settimeout(10.0)
+
+    def idle_time(self):
+        """Seconds since the last successful send or receive"""
+        return time.monotonic() - self.last_activity
+
     def send(self, Message):
         EndMessage = Message + "\r\n"
         data = bytes(EndMessage, 'utf-8')
         try:
-            self.Connection.send(data)
-        except SocketError as e:
+            self.Connection.sendall(data)
+        except (SocketError, AttributeError) as e:
             logging.warning("sending of "+ str(len(Message)) + "bytes was not succesful")
             return False
 
+        self.last_activity = time.monotonic()
         return True
 
     def receive(self):
+        """Returns the next complete reply line without its line ending"""
         try:
-            response = self.Connection.recv(self.BUFFER_SIZE);
-            responseString = response.decode("utf-8");
+            return self.receive_line()
         except SocketTimeout as e:
             raise TimeoutError("The robot did not respond in time");
         except SocketError as e:
             logging.warning("could not receive any data(" + str(e.errno) + ")")
             return ''
-        return responseString;
 
     def receiveWithTimeout(self, Timeout):
         try:
             self.Connection.settimeout(Timeout)
-            response = self.Connection.recv(self.BUFFER_SIZE).decode("utf-8")
-            self.Connection.settimeout(10)
+            response = self.receive_line()
         except SocketError as e:
             logging.warning("could not receive any data(" + str(e.errno) + ")")
             return ''
+        finally:
+            self.Connection.settimeout(10)
 
         return response
 
+    def receive_line(self):
+        """Reads until a complete CRLF framed line is buffered and returns it decoded.
+        Empty lines are skipped, an empty string means that the peer closed the connection.
+        Every byte is received and decoded exactly once.
+        """
+        while True:
+            end = self.buffer.find(b"\n", self.scan)
+            if(end >= 0):
+                with memoryview(self.buffer) as view:
+                    line = str(view[self.start:end], "utf-8").rstrip("\r")
+                self.start = self.scan = end + 1
+                if(line):
+                    return line
+                continue
+
+            self.scan = len(self.buffer)
+            if(self.start > 0):
+                #drop consumed lines before the buffer grows
+                del self.buffer[:self.start]
+                self.scan -= self.start
+                self.start = 0
+
+            received = self.Connection.recv_into(self.chunk_view)
+            if(received == 0):
+                return ''
+
+            self.buffer += self.chunk_view[:received]
+            self.last_activity = time.monotonic()
+
     def close(self):
-        self.Connection.shutdown(socket.SHUT_RDWR);
-        self.Connection.close()
+        self.__reset_buffer()
+        if(self.Connection is None):
+            return
+        try:
+            self.Connection.shutdown(socket.SHUT_RDWR);
+        finally:
+            self.Connection.close()
+            self.Connection = None
@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+
+from collections import deque;
+import logging;
+from Exception.Exception import DeviceStateError, ConnectionError;
+
+class GCodeStream(object):
+    """Streams G-code lines to the robot while keeping a bounded number of lines in flight.
+    Smoothie answers every line in order, so each "ok" acknowledges the oldest line 
+    in flight and "!!" fails it.
+    """
+
+    OK = "ok"
+    ERROR = "!!"
+    PROMPT = ">"
+
+    def __init__(self, socket, window=1):
+        self.socket = socket
+        self.window = max(1, window)
+        self.in_flight = deque()
+
+    def stream(self, lines):
+        """Sends (line, tag) pairs and yields the tag of every line as soon as it is acknowledged.
+        All lines which fit into the window are written with a single send.
+        """
+        lines = iter(lines)
+        exhausted = False
+
+        while(not exhausted or self.in_flight):
+            batch = []
+            while(not exhausted and len(self.in_flight) + len(batch) < self.window):
+                try:
+                    batch.append(next(lines))
+                except StopIteration:
+                    exhausted = True
+
+            if(batch):
+                self.__send(batch)
+
+            if(self.in_flight):
+                yield self.__wait_for_ack()
+
+    def idle(self):
+        """True if every line sent has been acknowledged"""
+        return not self.in_flight
+
+    def __send(self, batch):
+        message = "\r\n".join(line for (line, tag) in batch)
+        logging.debug("send to robot({}):".format(message.replace('\r\n', ' ')))
+        self.in_flight.extend(batch)
+        if(self.socket.send(message) is False):
+            raise ConnectionError("", "could not send to the robot")
+
+    def __wait_for_ack(self):
+        while True:
+            reply = self.__next_reply()
+            logging.debug("received from robot {}".format(reply))
+
+            if(reply.startswith(self.OK)):
+                (line, tag) = self.in_flight.popleft()
+                return tag
+
+            if(reply.startswith(self.ERROR)):
+                #the failing line stays in flight, Smoothie rejects everything after it until reset
+                (line, tag) = self.in_flight[0]
+                raise DeviceStateError(line, "Robot error:{}".format(reply))
+
+    def __next_reply(self):
+        reply = self.socket.receive()
+        if(not reply):
+            raise ConnectionError("", "connection to the robot was lost")
+
+        return reply.lstrip(self.PROMPT).strip()
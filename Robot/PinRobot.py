@@ -2,15 +2,28 @@
 
 from Parsers.ParseXml import XmlParser;
 from Robot.Communication import PEMSocket;
+from Robot.GCodeStream import GCodeStream;
 from Base.DeviceBase import DeviceBase;
 import logging
+import time
 from Exception.Exception import DeviceStateError, ConnectionError;
 
 class PinRobot(DeviceBase):
 
-    def __init__(self, enable_statistics=False, empower_card=False):
+    #reopen connections which have been idle longer than this (seconds)
+    IDLE_TIMEOUT = 300.0
+    #bounded exponential backoff between reconnect attempts (seconds)
+    RECONNECT_ATTEMPTS = 3
+    RECONNECT_BACKOFF_MIN = 0.25
+    RECONNECT_BACKOFF_MAX = 2.0
+
+    #G-code lines kept in flight while streaming a request
+    PIPELINE_DEPTH = 4
+
+    def __init__(self, enable_statistics=False, empower_card=False, pipeline_depth=PIPELINE_DEPTH):
         DeviceBase.__init__(self, enable_statistics);
         self.empower_card = empower_card;
+        self.pipeline_depth = pipeline_depth;
 
     def InitializeTerminal(self, filename):
         self.terminalList = XmlParser.parseXmlMultiplexer(filename)
@@ -21,17 +34,43 @@ class PinRobot(DeviceBase):
         logging.info("Initialization successful...")
         return True
 
+    def get_command_value(self, action):
+        return self.terminalList[action].Value
+
     def InitializeConnection(self, IP, Port):
         self.socket = PEMSocket(IP, Port)
    
         return self.connect()
 
     def connect(self):
+        """Ensures a connection to the robot. An open and alive connection is reused,
+        a dead or idle one is replaced by a new one
+        """
+        if(self.socket.is_connected() and self.socket.idle_time() < self.IDLE_TIMEOUT):
+            return True
+
+        self.close_connection()
+
+        backoff = self.RECONNECT_BACKOFF_MIN
+        for attempt in range(self.RECONNECT_ATTEMPTS):
+            if(attempt > 0):
+                logging.info("reconnect to {}:{} in {}s".format(self.socket.IP, self.socket.Port, backoff))
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.RECONNECT_BACKOFF_MAX)
+
+            if(self.__open_connection() is True):
+                return True
+
+            self.close_connection()
+
+        return False;
+
+    def __open_connection(self):
         try:
 
             if(self.socket.connect() is True):
                 response = self.socket.receive();
-                logging.debug("received from robot {}".format(response.replace('\r\n', '')));
+                logging.debug("received from robot {}".format(response));
                 if("Smoothie command shell" in response):
                     return True;
         except TimeoutError:
@@ -45,13 +84,14 @@ class PinRobot(DeviceBase):
             pass;
 
     def __ResponseEvaluate(self, response):
-        logging.debug("received from robot {}".format(response.replace('\r\n', '')))
+        logging.debug("received from robot {}".format(response))
         Result = False
         if(not response):
             return False;
-        if("ok" in response):
+        response = response.lstrip(GCodeStream.PROMPT).strip()
+        if(response.startswith(GCodeStream.OK)):
            Result = True
-        elif("!!" in response):
+        elif(response.startswith(GCodeStream.ERROR)):
             raise DeviceStateError("", "Robot error:{}".format(response));
         else:
            return False
@@ -60,72 +100,104 @@ class PinRobot(DeviceBase):
 
     def send_command(self, action):
         Result = False
+        for (command, Result) in self.send_commands([action], 1):
+            pass
+
+        return Result;
+
+    def send_commands(self, actions, window=None):
+        """Streams the G-code of all actions as one pipeline, keeping up to 'window' lines in flight.
+        Yields (action, result) for every action as soon as its last line is acknowledged.
+        The first failing action is reported with result False and ends the stream.
+        """
+        if(window is None):
+            window = self.pipeline_depth
+
+        lines = []
+        streamed = []
+        unknown = None
+        for action in actions:
+            if(action not in self.terminalList):
+                logging.error("action {} is not defined for this terminal".format(action))
+                unknown = action
+                break
+
+            action_lines = self.__action_lines(action)
+            for (index, line) in enumerate(action_lines):
+                lines.append((line, (action, index == len(action_lines) - 1)))
+            streamed.append(action)
+
+        stream = GCodeStream(self.socket, window)
+        #the lines are acknowledged in order, so the first action not done is the one being performed
+        done = 0
+        failed = None
         try:
+            for (action, last) in stream.stream(lines):
+                if(last):
+                    done += 1
+                    yield (action, True)
 
-           if(not self.terminalList[action].IsButton):
-               self.__increaseZCurrent();
-                             
-           actionValue = self.terminalList[action].Value;
-           logging.debug("send to robot({}):".format(actionValue.replace('\r\n', ' ')))
-           self.socket.send(actionValue);
-                         
-           Result = self.__ResponseEvaluate(self.socket.receive());
-           shouldPress = Result and self.terminalList[action].IsButton;
-
-           if(shouldPress):
-              Result = self.__pressButton();
-           elif(Result):
-              self.__reduceZCurrent();
         except TimeoutError:
-            logging.error("Robot did not respond in time performing the action {}".format(action));
-            pass;
+            failed = streamed[done]
+            logging.error("Robot did not respond in time performing the action {}".format(failed));
         except DeviceStateError as e:
-            logging.error("Robot is in an error state");
-            pass;
-        except:
-            logging.error("an unknown exception happened...");
-            pass
-
-        return Result;
+            failed = streamed[done]
+            logging.error("Robot is in an error state: {}".format(e.message));
+        except ConnectionError as e:
+            failed = streamed[done]
+            logging.error(e.message);
+        except Exception:
+            failed = streamed[done]
+            logging.exception("an unknown exception happened performing the action {}".format(failed));
+        finally:
+            if(not stream.idle()):
+                #the reply stream is in an unknown state, start over with a fresh connection
+                self.close_connection();
+
+        if(failed is not None):
+            yield (failed, False)
+        elif(unknown is not None):
+            yield (unknown, False)
+
+    def __action_lines(self, action):
+        """All G-code lines needed to perform an action"""
+        terminal = self.terminalList[action]
+        lines = [line.strip() for line in terminal.Value.split("\n") if line.strip()]
+
+        if(terminal.IsButton):
+            lines.extend(self.__pressButton())
+        elif(self.empower_card is True):
+            #Increases the current for Z Axis while moving the card
+            lines.insert(0, "M907 Z1.3")
+            lines.append("M907 Z0.5")
+
+        return lines
 
     def SendString(self, command):
-        logging.debug("send to robot({}):".format(command.replace('\r\n', ' ')))
-        self.socket.send(command)
+        lines = [(line.strip(), None) for line in command.split("\n") if line.strip()]
+        Result = False
+        try:
+            stream = GCodeStream(self.socket, len(lines))
+            for tag in stream.stream(lines):
+                pass
+            Result = True
+        except ConnectionError:
+            Result = False
 
-        return self.__ResponseEvaluate(self.socket.receive())
+        return Result
 
     def ReceiveResponse(self):
         self.__ResponseEvaluate(self.socket.receive())
 
     def __pressButton(self):
-        """press button function"""
+        """press button commands"""
        
         #There are 2 possibilities to control the speed of the button press:
         #1. Remove the "G4 S1.1" and listen to Smoothie responses in the function SendString.
         #2. Try to reduce the value in the command S1.1. The value 1.1 is in seconds. The lower the value (in seconds), the faster the button will be pressed.
-        pressButtonCommands = [
+        return [
             "M42", 
             "G4 P30", 
             "M43", 
             "G4 P800"
             ]
-
-        fullCommand =  "\r\n".join(pressButtonCommands) + "\r\n";
-           
-        return self.SendString(fullCommand)
-
-    def __increaseZCurrent(self):
-        """Increases the current for Z Axis if enabled"""
-        if(self.empower_card is True):
-            increaseCurrent = "M907 Z1.3\r\n"
-            return self.SendString(increaseCurrent)
-        else:
-            return True;
-
-    def __reduceZCurrent(self):
-        """Decreases the current for Z Axis"""
-        if(self.empower_card is True):
-            reduceCurrent = "M907 Z0.5\r\n"
-            return self.SendString(reduceCurrent)
-        else:
-            return True;
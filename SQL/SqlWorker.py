@@ -32,6 +32,7 @@ import sqlite3
 import threading
 import time
 import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 
 LOGGER = logging.getLogger('sqlite3worker')
 
@@ -51,80 +52,172 @@ class Sqlite3Worker(threading.Thread):
         sql_worker.execute("SELECT * from tester")
         sql_worker.close()
     """
-    def __init__(self, file_name, max_queue_size=100):
+    def __init__(self, file_name, max_queue_size=100, batch_size=500,
+                 batch_interval=0.05):
         """Automatically starts the thread.
 
         Args:
             file_name: The name of the file.
             max_queue_size: The max queries that will be queued.
+            batch_size: The max queries committed in one transaction.
+            batch_interval: Seconds a transaction waits for more queries.
         """
         threading.Thread.__init__(self)
         self.daemon = True
         self.sqlite3_conn = sqlite3.connect(
             file_name, check_same_thread=False,
             detect_types=sqlite3.PARSE_DECLTYPES)
+        # Readers do not block the writer and a commit does not wait for
+        # the disk, only checkpoints do.
+        self.sqlite3_conn.execute("PRAGMA journal_mode=WAL")
+        self.sqlite3_conn.execute("PRAGMA synchronous=NORMAL")
+        self.sqlite3_conn.execute("PRAGMA cache_size=-8000")
+        self.sqlite3_conn.execute("PRAGMA temp_store=MEMORY")
         self.sqlite3_cursor = self.sqlite3_conn.cursor()
         self.sql_queue = Queue.Queue(maxsize=max_queue_size)
-        self.results = {}
         self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
         self.exit_set = False
         # Token that is put into queue when close() is called.
         self.exit_token = str(uuid.uuid4())
         self.start()
         self.thread_running = True
 
+    @staticmethod
+    def is_select(query):
+        return query.lower().strip().startswith("select")
+
     def run(self):
         """Thread loop.
 
-        This is an infinite loop.  The iter method calls self.sql_queue.get()
-        which blocks if there are not values in the queue.  As soon as values
-        are placed into the queue the process will continue.
-
-        If many executes happen at once it will churn through them all before
-        calling commit() to speed things up by reducing the number of times
-        commit is called.
+        Waits for a query, then collects the following writes for up to
+        batch_interval seconds or batch_size queries and commits them in
+        one transaction. Consecutive writes of the same statement run
+        with one executemany. A select ends the transaction, so it sees
+        all writes queued before it.
         """
         LOGGER.debug("run: Thread started")
-        execute_count = 0
-        for token, query, values in iter(self.sql_queue.get, None):
-            LOGGER.debug("sql_queue: %s", self.sql_queue.qsize())
-            if token != self.exit_token:
-                LOGGER.debug("run: %s", query)
-                self.run_query(token, query, values)
-                execute_count += 1
-                # Let the executes build up a little before committing to disk
-                # to speed things up.
-                if (
-                        self.sql_queue.empty() or
-                        execute_count == self.max_queue_size):
-                    LOGGER.debug("run: commit")
-                    self.sqlite3_conn.commit()
-                    execute_count = 0
+        while True:
+            batch = [self.sql_queue.get()]
+            deadline = time.monotonic() + self.batch_interval
+            while (
+                    len(batch) < self.batch_size and
+                    batch[-1][0] != self.exit_token and
+                    not self.is_select(batch[-1][1])):
+                try:
+                    batch.append(self.sql_queue.get(
+                        timeout=max(deadline - time.monotonic(), 0)))
+                except Queue.Empty:
+                    break
+
+            LOGGER.debug("run: batch of %s, sql_queue: %s",
+                         len(batch), self.sql_queue.qsize())
+            try:
+                self.run_batch(batch)
+            except sqlite3.Error as err:
+                self.fail_batch(batch, err)
             # Only exit if the queue is empty. Otherwise keep getting
             # through the queue until it's empty.
             if self.exit_set and self.sql_queue.empty():
-                self.sqlite3_conn.commit()
+                try:
+                    self.sqlite3_conn.commit()
+                except sqlite3.Error as err:
+                    LOGGER.error("Commit on close returned error: %s", err)
                 self.sqlite3_conn.close()
                 self.thread_running = False
                 return
 
+    def fail_batch(self, batch, err):
+        """Roll back a batch which could not be committed.
+
+        The writes of the batch are lost, the selects not answered yet get
+        the error. The thread keeps serving the following batches.
+
+        Args:
+            batch: A list of (token, query, values).
+            err: The sqlite3.Error of the transaction.
+        """
+        LOGGER.error("Batch of %s queries failed: %s", len(batch), err)
+        try:
+            self.sqlite3_conn.rollback()
+        except sqlite3.Error as rollback_err:
+            LOGGER.error("Rollback returned error: %s", rollback_err)
+        for token, _, _ in batch:
+            if not isinstance(token, Future) or token.done():
+                continue
+            # A running select failed in the middle, a pending one was
+            # not reached or cancelled meanwhile.
+            if token.running() or token.set_running_or_notify_cancel():
+                token.set_exception(err)
+
+    def run_batch(self, batch):
+        """Run the queries of a batch and commit them.
+
+        Args:
+            batch: A list of (token, query, values).
+        """
+        # One transaction for the whole batch, the savepoints of run_many
+        # only undo a failing group.
+        if not self.sqlite3_conn.in_transaction:
+            self.sqlite3_cursor.execute("BEGIN")
+        query = None
+        rows = []
+        for token, next_query, values in batch:
+            if token == self.exit_token:
+                break
+            if rows and next_query != query:
+                self.run_many(query, rows)
+                rows = []
+            if self.is_select(next_query):
+                self.run_query(token, next_query, values)
+            else:
+                query = next_query
+                rows.append(values)
+        if rows:
+            self.run_many(query, rows)
+        LOGGER.debug("run: commit")
+        self.sqlite3_conn.commit()
+
+    def run_many(self, query, rows):
+        """Run a write statement for several rows.
+
+        Args:
+            query: A sql query with ? placeholders for values.
+            rows: A list of value tuples, one per execution.
+        """
+        LOGGER.debug("run: %s x %s", query, len(rows))
+        if len(rows) == 1:
+            self.run_query(None, query, rows[0])
+            return
+        self.sqlite3_cursor.execute("SAVEPOINT run_many")
+        try:
+            self.sqlite3_cursor.executemany(query, rows)
+        except sqlite3.Error:
+            # Undo the rows before the failing one and find the failing
+            # rows, the others are still written.
+            self.sqlite3_cursor.execute("ROLLBACK TO run_many")
+            for values in rows:
+                self.run_query(None, query, values)
+        self.sqlite3_cursor.execute("RELEASE run_many")
+
     def run_query(self, token, query, values):
         """Run a query.
 
         Args:
-            token: A uuid object of the query you want returned.
+            token: The Future receiving the results of a select.
             query: A sql query with ? placeholders for values.
             values: A tuple of values to replace "?" in query.
         """
-        if query.lower().strip().startswith("select"):
+        if self.is_select(query):
+            if not token.set_running_or_notify_cancel():
+                return
             try:
                 self.sqlite3_cursor.execute(query, values)
-                self.results[token] = self.sqlite3_cursor.fetchall()
+                token.set_result(self.sqlite3_cursor.fetchall())
             except sqlite3.Error as err:
-                # Put the error into the output queue since a response
-                # is required.
-                self.results[token] = (
-                    "Query returned error: %s: %s: %s" % (query, values, err))
+                # The caller gets the error raised from query_results.
+                token.set_exception(err)
                 LOGGER.error(
                     "Query returned error: %s: %s: %s", query, values, err)
         else:
@@ -147,35 +240,52 @@ class Sqlite3Worker(threading.Thread):
         """Return the queue size."""
         return self.sql_queue.qsize()
 
-    def query_results(self, token):
+    def query_results(self, token, timeout=None):
         """Get the query results for a specific token.
 
         Args:
-            token: A uuid object of the query you want returned.
+            token: The Future of the query you want returned.
+            timeout: Seconds to wait for the results, None waits forever.
 
         Returns:
-            Return the results of the query when it's executed by the thread.
+            Return the results of the query as soon as the thread executed it.
+
+        Raises:
+            sqlite3.Error: The query failed.
+            TimeoutError: The query did not finish within timeout seconds.
         """
-        delay = .001
-        while True:
-            if token in self.results:
-                return_val = self.results[token]
-                del self.results[token]
-                return return_val
-            # Double back on the delay to a max of 8 seconds.  This prevents
-            # a long lived select statement from trashing the CPU with this
-            # infinite loop as it's waiting for the query results.
-            LOGGER.debug("Sleeping: %s %s", delay, token)
-            time.sleep(delay)
-            if delay < 8:
-                delay += delay
-
-    def execute(self, query, values=None):
+        try:
+            return token.result(timeout)
+        except FutureTimeoutError:
+            # concurrent.futures has its own TimeoutError before Python 3.11
+            raise TimeoutError(
+                "query did not finish within {} seconds".format(timeout))
+
+    def execute_nowait(self, query, values=None):
+        """Queue a query which returns no results without blocking.
+
+        Args:
+            query: The sql string using ? for placeholders of dynamic values.
+            values: A tuple of values to be replaced into the ? of the query.
+
+        Returns:
+            False if the queue is full or the worker is closing.
+        """
+        if self.exit_set:
+            return False
+        try:
+            self.sql_queue.put_nowait((None, query, values or []))
+        except Queue.Full:
+            return False
+        return True
+
+    def execute(self, query, values=None, timeout=None):
         """Execute a query.
 
         Args:
             query: The sql string using ? for placeholders of dynamic values.
             values: A tuple of values to be replaced into the ? of the query.
+            timeout: Seconds to wait for the results of a select.
 
         Returns:
             If it's a select query it will return the results of the query.
@@ -185,12 +295,31 @@ class Sqlite3Worker(threading.Thread):
             return "Exit Called"
         LOGGER.debug("execute: %s", query)
         values = values or []
-        # A token to track this query with.
-        token = str(uuid.uuid4())
-        # If it's a select we queue it up with a token to mark the results
-        # into the output queue so we know what results are ours.
-        if query.lower().strip().startswith("select"):
-            self.sql_queue.put((token, query, values), timeout=5)
-            return self.query_results(token)
+        # If it's a select we queue it up with a Future which the thread
+        # completes with the results.
+        if self.is_select(query):
+            return self.query_results(
+                self.submit(query, values, block=True), timeout)
         else:
-            self.sql_queue.put((token, query, values), timeout=5)
+            self.sql_queue.put((None, query, values), timeout=5)
+
+    def submit(self, query, values=None, block=False):
+        """Queue a select without waiting for it.
+
+        Args:
+            query: The sql select using ? for placeholders of dynamic values.
+            values: A tuple of values to be replaced into the ? of the query.
+            block: Wait up to 5 seconds while the queue is full.
+
+        Returns:
+            The Future which the thread completes with the results.
+
+        Raises:
+            queue.Full: The queue is full.
+        """
+        token = Future()
+        if self.exit_set:
+            token.set_exception(sqlite3.ProgrammingError("Exit Called"))
+            return token
+        self.sql_queue.put((token, query, values or []), block, timeout=5)
+        return token
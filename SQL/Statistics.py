@@ -1,14 +1,52 @@
 #!/usr/bin/python3
 
 from SQL.SqlWorker import Sqlite3Worker
+from Base.Futures import whenAll
+from Exception.Exception import BusyError
 from threading import Lock
+import logging
+import queue
+import sqlite3
 import time
 
 class Statistics(object):
-    """description of class"""
-    def __init__(self):
-        self.sqlWorker = Sqlite3Worker("statistics.db")
+    """Command statistics of all devices, written by one worker thread.
+
+    insert never blocks: records are buffered in the bounded queue of the worker
+    and dropped (and counted) while the queue is full.
+
+    A trigger maintains hourly rollups of the counts and durations and a latency
+    histogram with quarter octave bins, the read methods only scan those.
+    The trigger uses UPSERT, which needs SQLite 3.24.
+    """
+
+    MAX_BUFFERED = 10000
+    INSERT = (
+        "INSERT INTO statistics "
+        "(timestamp, robot_id, command_id, command, duration_ms) "
+        "VALUES (?, ?, ?, ?, ?)"
+        )
+
+    #upper bound of latency bin i is 2^(i/4) ms, the last bin takes everything above
+    LATENCY_BINS = 81
+    PERCENTILES = (50, 90, 99)
+    BUCKETS = {'hour': 13, 'day': 10, 'month': 7}
+    #seconds a report may take before it is answered with 503
+    QUERY_TIMEOUT = 10.0
+    MIN_SQLITE_VERSION = (3, 24, 0)
+
+    shared_mutex = Lock()
+    shared_instance = None
+
+    def __init__(self, file_name="statistics.db", max_buffered=MAX_BUFFERED):
+        if(sqlite3.sqlite_version_info < Statistics.MIN_SQLITE_VERSION):
+            raise RuntimeError("statistics need SQLite {} or newer, found {}".format(
+                ".".join(str(part) for part in Statistics.MIN_SQLITE_VERSION), sqlite3.sqlite_version))
+
+        self.sqlWorker = Sqlite3Worker(file_name, max_buffered)
         self.mutex = Lock()
+        self.dropped = 0
+        self.overflowing = False
 
         query = (
             "CREATE TABLE if not exists statistics "
@@ -17,30 +55,172 @@ class Statistics(object):
             "timestamp DATETIME,"
             "robot_id varchar(30),"
             "command_id varchar(20),"
-            "command varchar(20)"
+            "command varchar(20),"
+            "duration_ms REAL"
             ");"
             )
         self.sqlWorker.execute(query)
+        self.__create_rollups()
+
+    def __create_rollups(self):
+        columns = [row[1] for row in self.sqlWorker.execute("SELECT * FROM pragma_table_info('statistics')")]
+        if('duration_ms' not in columns):
+            self.sqlWorker.execute("ALTER TABLE statistics ADD COLUMN duration_ms REAL")
 
-    def insert(self, robot_id, command_id, command):
-        query =  (
-            "INSERT INTO statistics "
+        self.sqlWorker.execute("CREATE INDEX if not exists statistics_robot_timestamp ON statistics (robot_id, timestamp)")
+        self.sqlWorker.execute(
+            "CREATE TABLE if not exists statistics_rollup "
             "("
-            "timestamp, robot_id, command_id, command"
-            ") "
-            "VALUES "
-            "( "
-            "\"" + time.strftime('%Y-%m-%d %H:%M:%S') + "\", "
-            "\"" + robot_id + "\", "
-            "\"" + command_id + "\", "
-            "\"" + command + "\""
-            ")"
-            )
-        self.mutex.acquire()
+            "robot_id varchar(30),"
+            "bucket DATETIME,"
+            "command_id varchar(20),"
+            "count INTEGER,"
+            "duration_count INTEGER,"
+            "duration_sum REAL,"
+            "PRIMARY KEY (robot_id, bucket, command_id)"
+            ");"
+            )
+        self.sqlWorker.execute(
+            "CREATE TABLE if not exists statistics_latency "
+            "("
+            "robot_id varchar(30),"
+            "bucket DATETIME,"
+            "command_id varchar(20),"
+            "bin INTEGER,"
+            "count INTEGER,"
+            "PRIMARY KEY (robot_id, bucket, command_id, bin)"
+            ");"
+            )
+        self.sqlWorker.execute("CREATE TABLE if not exists statistics_latency_bins (bin INTEGER PRIMARY KEY, upper_ms REAL);")
+        for i in range(Statistics.LATENCY_BINS):
+            upper = 1e12 if i == Statistics.LATENCY_BINS - 1 else round(2 ** (i / 4.0), 3)
+            self.sqlWorker.execute("INSERT OR IGNORE INTO statistics_latency_bins VALUES (?, ?)", (i, upper))
+
+        rollup = (
+            "INSERT INTO statistics_rollup (robot_id, bucket, command_id, count, duration_count, duration_sum) "
+            "SELECT robot_id, strftime('%Y-%m-%d %H:00:00', timestamp), command_id, {count}, {duration_count}, {duration_sum} {source} "
+            "ON CONFLICT (robot_id, bucket, command_id) DO UPDATE SET "
+            "count = count + excluded.count, "
+            "duration_count = duration_count + excluded.duration_count, "
+            "duration_sum = duration_sum + excluded.duration_sum;"
+            )
+        latency = (
+            "INSERT INTO statistics_latency (robot_id, bucket, command_id, bin, count) "
+            "SELECT robot_id, strftime('%Y-%m-%d %H:00:00', timestamp), command_id, "
+            "(SELECT min(bin) FROM statistics_latency_bins WHERE upper_ms >= duration_ms), {count} {source} "
+            "ON CONFLICT (robot_id, bucket, command_id, bin) DO UPDATE SET count = count + excluded.count;"
+            )
+
+        if(not self.sqlWorker.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name = 'statistics_rollup'")):
+            #rows written before the rollups existed
+            source = "FROM statistics WHERE true GROUP BY 1, 2, 3"
+            self.sqlWorker.execute(rollup.format(count="count(*)", duration_count="count(duration_ms)",
+                                                 duration_sum="coalesce(sum(duration_ms), 0)", source=source))
+            self.sqlWorker.execute(latency.format(count="count(*)", source="FROM statistics WHERE duration_ms IS NOT NULL GROUP BY 1, 2, 3, 4"))
 
+            new = "FROM (SELECT NEW.robot_id AS robot_id, NEW.timestamp AS timestamp, NEW.command_id AS command_id, NEW.duration_ms AS duration_ms) WHERE {}"
+            self.sqlWorker.execute(
+                "CREATE TRIGGER statistics_rollup AFTER INSERT ON statistics BEGIN " +
+                rollup.format(count="1", duration_count="duration_ms IS NOT NULL", duration_sum="coalesce(duration_ms, 0)", source=new.format("true")) +
+                latency.format(count="1", source=new.format("duration_ms IS NOT NULL")) +
+                " END;"
+                )
+
+    @staticmethod
+    def shared():
+        """The process wide statistics, all devices write through it"""
+        with Statistics.shared_mutex:
+            if(Statistics.shared_instance is None):
+                Statistics.shared_instance = Statistics()
+            return Statistics.shared_instance
+
+    def insert(self, robot_id, command_id, command, duration=None):
+        """Records an executed command, duration in seconds"""
+        values = (time.strftime('%Y-%m-%d %H:%M:%S'), robot_id, command_id, command,
+                  None if duration is None else duration * 1000.0)
+
+        queued = self.sqlWorker.execute_nowait(Statistics.INSERT, values)
+        with self.mutex:
+            if(not queued):
+                self.dropped += 1
+                if(not self.overflowing):
+                    logging.warning("statistics buffer is full, dropping records")
+            elif(self.overflowing):
+                logging.warning("statistics dropped {} records so far".format(self.dropped))
+            self.overflowing = not queued
+
+        return queued
+
+    def status(self):
+        return {'buffered': self.sqlWorker.queue_size, 'dropped': self.dropped}
+
+    def __filter(self, robot_id, start, end, command_id=None):
+        conditions = []
+        values = []
+        for (condition, value) in (("robot_id = ?", robot_id), ("command_id = ?", command_id), ("bucket >= ?", start), ("bucket < ?", end)):
+            if(value is not None):
+                conditions.append(condition)
+                values.append(value)
+
+        return (" WHERE " + " AND ".join(conditions) if conditions else "", values)
+
+    def __query(self, query, values, render):
+        """Future of render(rows)"""
         try:
-            self.sqlWorker.execute(query)
-        except:
-            pass
-        finally:
-            self.mutex.release()
+            future = self.sqlWorker.submit(query, values)
+        except queue.Full:
+            raise BusyError("", "statistics buffer is full", 1)
+        return whenAll([future], lambda: render(future.result()))
+
+    def presses(self, robot_id=None, start=None, end=None, bucket='hour'):
+        """Future of the executed commands per robot and time bucket (hour, day or month)"""
+        length = Statistics.BUCKETS[bucket]
+        (where, values) = self.__filter(robot_id, start, end)
+        query = (
+            "SELECT robot_id, substr(bucket, 1, {}), sum(count) FROM statistics_rollup{} "
+            "GROUP BY 1, 2 ORDER BY 1, 2".format(length, where)
+            )
+        return self.__query(query, values, lambda rows: [
+            {'robot_id': row[0], 'bucket': row[1], 'count': row[2]} for row in rows])
+
+    def commands(self, robot_id=None, start=None, end=None):
+        """Future of the usage and average duration of every command per robot"""
+        (where, values) = self.__filter(robot_id, start, end)
+        query = (
+            "SELECT robot_id, command_id, sum(count), sum(duration_sum) / nullif(sum(duration_count), 0) "
+            "FROM statistics_rollup{} GROUP BY 1, 2 ORDER BY 1, 3 DESC".format(where)
+            )
+        return self.__query(query, values, lambda rows: [
+            {'robot_id': row[0], 'command_id': row[1], 'count': row[2],
+             'average_ms': None if row[3] is None else round(row[3], 3)} for row in rows])
+
+    def latency(self, robot_id=None, start=None, end=None, command_id=None, percentiles=PERCENTILES, bucket='hour'):
+        """Future of the latency percentiles per robot and time bucket, the upper bound of the histogram bin in ms"""
+        length = Statistics.BUCKETS[bucket]
+        (where, values) = self.__filter(robot_id, start, end, command_id)
+        query = (
+            "SELECT robot_id, substr(bucket, 1, {}), upper_ms, sum(count) FROM statistics_latency "
+            "JOIN statistics_latency_bins USING (bin){} GROUP BY 1, 2, 3 ORDER BY 1, 2, 3".format(length, where)
+            )
+        return self.__query(query, values, lambda rows: Statistics.__percentiles(rows, percentiles))
+
+    @staticmethod
+    def __percentiles(rows, percentiles):
+        histograms = {}
+        for (robot_id, bucket, upper_ms, count) in rows:
+            histograms.setdefault((robot_id, bucket), []).append((upper_ms, count))
+
+        result = []
+        for ((robot_id, bucket), histogram) in histograms.items():
+            total = sum(count for (upper_ms, count) in histogram)
+            entry = {'robot_id': robot_id, 'bucket': bucket, 'count': total}
+            for percentile in percentiles:
+                (rank, seen) = (total * percentile / 100.0, 0)
+                for (upper_ms, count) in histogram:
+                    seen += count
+                    if(seen >= rank):
+                        entry['p{}'.format(percentile)] = upper_ms
+                        break
+            result.append(entry)
+
+        return result
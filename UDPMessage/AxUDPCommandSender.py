@@ -12,9 +12,28 @@ class AxUDPCommandSender(object):
 
     udp_helper  = object();
     
-    def __init__(self, ip_address, iface, magic):
-        self.udp_helper = UDPHelper(ip_address, iface, magic);
+    #commands which may be sent again when the answer is lost, by magic
+    IDEMPOTENT = {
+        bytes(UDPMagics.CardMultiplexerMagic): {
+            int(AxUDPCardMultiplexerCommand.INFO), int(AxUDPCardMultiplexerCommand.SET_PORT),
+            int(AxUDPCardMultiplexerCommand.GET_PORT), int(AxUDPCardMultiplexerCommand.CARD_TRACE)},
+        bytes(UDPMagics.CardMagstriperMagic): {
+            int(AxUDPCardMagstriperCommand.INFO), int(AxUDPCardMagstriperCommand.SetTrack1),
+            int(AxUDPCardMagstriperCommand.SetTrack2), int(AxUDPCardMagstriperCommand.SetTrack3),
+            int(AxUDPCardMagstriperCommand.ClearTracks), int(AxUDPCardMagstriperCommand.SetTrackClock),
+            int(AxUDPCardMagstriperCommand.SetTrackOptions)}
+        };
+    
+    def __init__(self, ip_address, iface, magic, retransmit=None):
+        self.udp_helper = UDPHelper(ip_address, iface, magic, retransmit);
         self.magic = magic;
+        #called without arguments when the device may have restarted and lost its state
+        self.reset_listener = None;
+
+    def reset(self):
+        """The device got a new address, reappeared after a missed discovery or did not answer"""
+        if(self.reset_listener is not None):
+            self.reset_listener();
 
     def set_mac_address(self, mac_address):
         if(mac_address is None):
@@ -23,7 +42,7 @@ class AxUDPCommandSender(object):
         request = AxUDPMessage(self.magic);
         request.command = int(AxUDPCommand.SET_MAC_ADDRESS);
         request.data = mac_address;
-        response = self.udp_helper.send_message(request.get_bytes());
+        response = self.send(request);
         self.validate_response(request, response);
 
     def set_port(self, port_number):
@@ -37,7 +56,7 @@ class AxUDPCommandSender(object):
         request = AxUDPMessage(self.magic);
         request.command = int(AxUDPCardMultiplexerCommand.SET_PORT);
         request.data = bytes([port_number]);
-        response = self.udp_helper.send_message(request.get_bytes());
+        response = self.send(request);
         return self.validate_response(request, response);
 
     def set_card_magstripe_track(self, command :  AxUDPCardMagstriperCommand, track_data : bytes):
@@ -45,14 +64,27 @@ class AxUDPCommandSender(object):
         request = AxUDPMessage(self.magic);
         request.command = int(command);
         request.data = track_data;
-        response = self.udp_helper.send_message(request.get_bytes());
+        response = self.send(request);
         return self.validate_response(request, response);
 
 
+    def send_track_frames(self, frames):
+        """Loads several tracks in one burst, frames is a list of (\ref AxUDPCardMagstriperCommand, frame bytes) compiled in advance"""
+        responses = self.udp_helper.send_messages([frame for (command, frame) in frames], True);
+        for ((command, frame), response) in zip(frames, responses):
+            self.validate_response(AxUDPMessage(self.magic, int(command)), response);
+        return True;
+
+    def clear_tracks(self):
+        request = AxUDPMessage(self.magic);
+        request.command = int(AxUDPCardMagstriperCommand.ClearTracks);
+        response = self.send(request);
+        return self.validate_response(request, response);
+
     def send_tracks(self):
         request = AxUDPMessage(self.magic);
         request.command = int(AxUDPCardMagstriperCommand.SendTracks);
-        response = self.udp_helper.send_message(request.get_bytes());
+        response = self.send(request);
         return self.validate_response(request, response);
 
 
@@ -60,7 +92,22 @@ class AxUDPCommandSender(object):
         raise NotImplementedError();
 
     def get_port(self):
-        raise NotImplementedError();
+        """
+        Returns the active port 1 - 16, 0 if all ports are disabled
+        """
+        request = AxUDPMessage(self.magic);
+        request.command = int(AxUDPCardMultiplexerCommand.GET_PORT);
+        response = self.send(request);
+        self.validate_response(request, response);
+
+        if(len(response.data) < 1):
+            raise AssertionError("GET_PORT returned no port");
+
+        return response.data[0];
+
+    def send(self, request : AxUDPMessage):
+        idempotent = request.command in AxUDPCommandSender.IDEMPOTENT.get(bytes(self.magic), ());
+        return self.udp_helper.send_message(request.get_bytes(), idempotent);
 
     def validate_response(self, request : AxUDPMessage, response : AxUDPMessage):
         if(response.command == int(AxUDPCommand.ERROR)):
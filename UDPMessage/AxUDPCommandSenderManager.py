@@ -1,17 +1,47 @@
 #!/usr/bin/python3
 
+import threading;
+import time;
+import logging;
 from UDPMessage.AxUDPCommandSender import AxUDPCommandSender;
 from UDPMessage.UDPHelper import UDPHelper;
+from UDPMessage.UDPMagics import UDPMagics;
 
 class AxUDPCommandSenderManager(object):
-    """Manages all \ref AxUDPCommandSender"""
+    """
+    Manages all \ref AxUDPCommandSender
+    
+    The senders are shared by all managers. A lookup of an unknown device runs one discovery sweep for all magics,
+    concurrent lookups wait for the running sweep instead of starting their own. Devices missing in a sweep are
+    reported absent without a new sweep for NEGATIVE_TTL seconds.
+
+    Once a device was found a background thread repeats the sweep every REDISCOVERY_INTERVAL seconds and
+    whenever a command timed out, so devices which got a new address are reached again without a restart.
+    Devices which moved, reappeared after a missed sweep or timed out may have restarted, their sender is reset.
+    """
 
     #Always just one
     AxUDPCommandSenders = {};
 
+    #seconds a sweep answers lookups of devices which did not reply
+    NEGATIVE_TTL = 30.0
+    REDISCOVERY_INTERVAL = 60.0
+
+    magics = [UDPMagics.CardMultiplexerMagic, UDPMagics.CardMagstriperMagic];
+    sweep_condition = threading.Condition();
+    sweeping = False;
+    last_sweep = None;
+    last_seen = {};
+    #known devices which did not answer the last sweep
+    missing = set();
+    rediscovery_thread = None;
+    rediscovery_event = threading.Event();
+
     def __init__(self, magic):
         self.magic = magic;
-        pass;    
+        with AxUDPCommandSenderManager.sweep_condition:
+            if(magic not in AxUDPCommandSenderManager.magics):
+                AxUDPCommandSenderManager.magics.append(magic);
 
     def get_sender_for_device(self, mac_address):
         return AxUDPCommandSenderManager.AxUDPCommandSenders[bytes(mac_address)];
@@ -19,22 +49,104 @@ class AxUDPCommandSenderManager(object):
     def device_lookup(self, mac_address):
         if(self.device_exists(mac_address)):
             return True;
-        else:
-            messages = UDPHelper.fill_devices(self.magic);
 
-            for info in messages:
-                self.add_or_update_device_address(info.RemoteIpAddress, info.MacAddress, info.iface);
+        manager = AxUDPCommandSenderManager;
+        with manager.sweep_condition:
+            while True:
+                if(self.device_exists(mac_address)):
+                    return True;
+
+                if(manager.sweeping):
+                    manager.sweep_condition.wait();
+                elif(manager.last_sweep is not None and time.monotonic() - manager.last_sweep < manager.NEGATIVE_TTL):
+                    logging.debug('device {} did not answer the last discovery'.format(bytes(mac_address).hex()));
+                    return False;
+                else:
+                    manager.sweeping = True;
+                    break;
 
-            if(self.device_exists(mac_address)):
-                return True;
-            else:
-                return False;
+        AxUDPCommandSenderManager.sweep();
+        if(self.device_exists(mac_address)):
+            AxUDPCommandSenderManager.start_rediscovery();
+            return True;
+        return False;
+
+    @staticmethod
+    def sweep():
+        """Discovers the devices of all magics and updates their senders, the caller must have set sweeping"""
+        manager = AxUDPCommandSenderManager;
+        started = time.monotonic();
+        try:
+            for info in UDPHelper.discover(*list(manager.magics)):
+                manager.update_device(info.RemoteIpAddress, info.MacAddress, info.iface, info.magic);
+            manager.missing = set(key for key in manager.AxUDPCommandSenders if manager.last_seen.get(key, 0.0) < started);
+        finally:
+            with manager.sweep_condition:
+                manager.sweeping = False;
+                manager.last_sweep = time.monotonic();
+                manager.sweep_condition.notify_all();
 
     def device_exists(self, mac_address):
         return bytes(mac_address) in AxUDPCommandSenderManager.AxUDPCommandSenders;
 
-    def add_or_update_device_address(self, remote_ip_address, mac_address, iface):
-        if(self.device_exists(mac_address)):
-            AxUDPCommandSenderManager.AxUDPCommandSenders[bytes(mac_address)].udp_helper.target_ip = remote_ip_address;
-        else:
-            AxUDPCommandSenderManager.AxUDPCommandSenders[bytes(mac_address)] = AxUDPCommandSender(remote_ip_address, iface, self.magic);
+    def add_or_update_device_address(self, remote_ip_address, mac_address, iface, magic=None):
+        AxUDPCommandSenderManager.update_device(remote_ip_address, mac_address, iface, self.magic if magic is None else magic);
+
+    @staticmethod
+    def update_device(remote_ip_address, mac_address, iface, magic):
+        key = bytes(mac_address);
+        AxUDPCommandSenderManager.last_seen[key] = time.monotonic();
+        sender = AxUDPCommandSenderManager.AxUDPCommandSenders.get(key);
+        if(sender is None):
+            sender = AxUDPCommandSender(remote_ip_address, iface, magic);
+            sender.udp_helper.timeout_listener = lambda: AxUDPCommandSenderManager.command_timed_out(sender);
+            AxUDPCommandSenderManager.AxUDPCommandSenders[key] = sender;
+        elif(sender.udp_helper.target_ip != remote_ip_address or sender.udp_helper.iface != iface):
+            logging.info('device {} moved from {} to {}'.format(key.hex(), sender.udp_helper.target_ip, remote_ip_address));
+            #updated in place, the next command goes to the new address
+            sender.udp_helper.iface = iface;
+            sender.udp_helper.target_ip = remote_ip_address;
+            sender.reset();
+        elif(key in AxUDPCommandSenderManager.missing):
+            logging.info('device {} is back on {}'.format(key.hex(), remote_ip_address));
+            sender.reset();
+        AxUDPCommandSenderManager.missing.discard(key);
+
+    @staticmethod
+    def command_timed_out(sender):
+        sender.reset();
+        AxUDPCommandSenderManager.request_rediscovery();
+
+    @staticmethod
+    def request_rediscovery():
+        """Wakes up the background discovery, the caller does not wait for it"""
+        AxUDPCommandSenderManager.rediscovery_event.set();
+
+    @staticmethod
+    def start_rediscovery():
+        manager = AxUDPCommandSenderManager;
+        with manager.sweep_condition:
+            if(manager.rediscovery_thread is not None):
+                return;
+            manager.rediscovery_thread = threading.Thread(target=manager.__rediscover, name="udp-rediscovery");
+            manager.rediscovery_thread.daemon = True;
+        manager.rediscovery_thread.start();
+
+    @staticmethod
+    def __rediscover():
+        manager = AxUDPCommandSenderManager;
+        while True:
+            if(manager.rediscovery_event.wait(manager.REDISCOVERY_INTERVAL)):
+                logging.info('command timed out, rediscovering devices');
+            manager.rediscovery_event.clear();
+
+            with manager.sweep_condition:
+                if(manager.sweeping):
+                    #a lookup is sweeping right now
+                    continue;
+                manager.sweeping = True;
+
+            try:
+                manager.sweep();
+            except Exception:
+                logging.exception('device rediscovery failed');
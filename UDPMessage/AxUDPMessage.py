@@ -1,63 +1,60 @@
 #!/usr/bin/python3
 
-import sys;
+import struct;
 
 class AxUDPMessage(object):
-    """Message struct"""
+    """
+    Message struct
 
-    command = 0;
-    data = [];
+    UDP Frame definition: MAGIC[8] Command[2] DataLength[2] Data[0..512], little endian
+    """
 
-    def __init__(self, magic):
-        del self.data[:]
-        self.command = 0;
+    HEADER = struct.Struct("<8sHH");
+    MAX_DATA_LENGTH = 512;
+
+    def __init__(self, magic, command=0, data=b''):
         self.magic = magic;
+        self.command = command;
+        self.data = data;
+
+    @property
+    def data(self):
+        return self.__data;
+
+    @data.setter
+    def data(self, value):
+        #immutable per message, a caller can not change a frame after it was handed over
+        self.__data = b'' if value is None else bytes(value);
 
     @staticmethod
     def parse(expectedMagic, payload):
-        """
-        Parse received UDP frame
-        UDP Frame definition: MAGIC[8] MessageSequence[2] Command[2] DataLength[2] Data[0..512] 
-        """
+        """Parse received UDP frame"""
 
         if(payload is None):
             raise AttributeError();
 
-        if(sys.getsizeof(payload) < 12):
-            raise BufferError("Length must be at least 12 bytes");
+        view = memoryview(payload);
+        if(len(view) < AxUDPMessage.HEADER.size):
+            raise BufferError("Length must be at least {} bytes".format(AxUDPMessage.HEADER.size));
 
-        command_type = (payload[9] << 8) + payload[8]; 
-        data_length = (payload[11] << 8) + payload[10];
+        (magic, command_type, data_length) = AxUDPMessage.HEADER.unpack_from(view);
 
-        if((payload[:8] == bytearray(expectedMagic)) is False):
+        if(magic != bytes(expectedMagic)):
             raise RuntimeError();
 
-        msg = AxUDPMessage(expectedMagic);
-
-        msg.command = command_type;
+        end = AxUDPMessage.HEADER.size + data_length;
+        if(end > len(view)):
+            raise BufferError("DataLength {} exceeds the received {} bytes".format(data_length, len(view) - AxUDPMessage.HEADER.size));
 
-        for a in payload[12:]:
-            msg.data.append(a);
-
-        return msg;
+        return AxUDPMessage(expectedMagic, command_type, view[AxUDPMessage.HEADER.size:end]);
 
     def get_bytes(self):
+        length = len(self.__data);
+        if(length > AxUDPMessage.MAX_DATA_LENGTH):
+            raise BufferError("Data must not exceed {} bytes".format(AxUDPMessage.MAX_DATA_LENGTH));
 
-        if(self.data is None):
-            #TODO
-            pass;
-        
-        list = [];
-
-        for single_value in self.magic:
-            list.append(single_value);
-
-        list.append(self.command);
-        list.append(self.command >> 8);
-        list.append(len(self.data));
-        list.append(len(self.data) >> 8);
-        if(len(self.data) > 0):
-            for value in self.data:
-                list.append(value);
+        frame = bytearray(AxUDPMessage.HEADER.size + length);
+        AxUDPMessage.HEADER.pack_into(frame, 0, bytes(self.magic), self.command, length);
+        frame[AxUDPMessage.HEADER.size:] = self.__data;
 
-        return bytearray(list);
+        return frame;
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+
+import threading;
+
+class RetransmitPolicy(object):
+    """
+    Retransmission timeout of one device, estimated from its round trip times like TCP does (RFC 6298).
+
+    Idempotent commands are sent again after every timeout, which doubles on each attempt, until max_retries
+    retransmissions or the overall deadline of max_timeout seconds. Other commands are sent once and wait for
+    max_timeout seconds. Round trips of retransmitted commands are ambiguous and not sampled (Karn's algorithm).
+    """
+
+    ALPHA = 0.125;
+    BETA = 0.25;
+
+    def __init__(self, max_retries=3, initial_timeout=0.25, min_timeout=0.02, max_timeout=2.0):
+        self.max_retries = max_retries;
+        self.min_timeout = min_timeout;
+        self.max_timeout = max_timeout;
+        self.timeout = initial_timeout;
+        self.srtt = None;
+        self.rttvar = None;
+        self.mutex = threading.Lock();
+
+    def timeouts(self, idempotent):
+        """Seconds to wait after each transmission"""
+        if(not idempotent):
+            return [self.max_timeout];
+
+        with self.mutex:
+            timeout = self.timeout;
+        return [min(timeout * (2 ** attempt), self.max_timeout) for attempt in range(self.max_retries + 1)];
+
+    def sample(self, rtt):
+        """Round trip time of a command answered on its first transmission"""
+        with self.mutex:
+            if(self.srtt is None):
+                self.srtt = rtt;
+                self.rttvar = rtt / 2.0;
+            else:
+                self.rttvar = (1.0 - RetransmitPolicy.BETA) * self.rttvar + RetransmitPolicy.BETA * abs(self.srtt - rtt);
+                self.srtt = (1.0 - RetransmitPolicy.ALPHA) * self.srtt + RetransmitPolicy.ALPHA * rtt;
+            self.timeout = min(max(self.srtt + 4.0 * self.rttvar, self.min_timeout), self.max_timeout);
+
+    def backoff(self):
+        """The device did not answer at all, start the next command with a longer timeout"""
+        with self.mutex:
+            self.timeout = min(self.timeout * 2.0, self.max_timeout);
+
+    def status(self):
+        with self.mutex:
+            return {
+                'srtt': None if self.srtt is None else round(self.srtt, 4),
+                'rttvar': None if self.rttvar is None else round(self.rttvar, 4),
+                'timeout': round(self.timeout, 4)
+                };
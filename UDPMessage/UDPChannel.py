@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+
+import socket;
+import threading;
+import time;
+import logging;
+from UDPMessage.AxUDPCommand import AxUDPCommand;
+from AxHw.Interfaces import Interfaces;
+
+class PendingRequest(object):
+    """A request waiting for the reply of one device"""
+
+    def __init__(self, address, command):
+        self.address = address;
+        self.command = command;
+        self.data = None;
+        self.received = None;
+        self.event = threading.Event();
+
+    def matches(self, command):
+        return command == self.command or command == int(AxUDPCommand.ERROR);
+
+    def wait(self, timeout):
+        """Returns the received datagram or None if the device did not answer within timeout seconds"""
+        self.event.wait(timeout);
+        return self.data;
+
+class UDPChannel(object):
+    """
+    One long lived socket per interface, shared by all devices behind it.
+
+    The frames carry no sequence number, so a reader thread hands every reply to the oldest request waiting
+    for the same address and command (an ERROR reply matches any command). Replies nobody waits for,
+    i.e. late answers of timed out requests and duplicates, are discarded.
+    """
+
+    BUFFER_SIZE = 10100;
+
+    channels = {};
+    mutex = threading.Lock();
+
+    @staticmethod
+    def get(iface):
+        with UDPChannel.mutex:
+            channel = UDPChannel.channels.get(iface);
+            if(channel is None or channel.closed):
+                channel = UDPChannel(iface);
+                UDPChannel.channels[iface] = channel;
+            return channel;
+
+    def __init__(self, iface):
+        self.iface = iface;
+        self.closed = False;
+        self.pending = {};
+        self.mutex = threading.Lock();
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM);
+        try:
+            self.sock.bind((Interfaces.get_local_ip_from_interface(iface), 0));
+        except OSError:
+            #the address of the interface changed
+            self.sock.close();
+            Interfaces.refresh();
+            raise;
+
+        self.reader = threading.Thread(target=self.__read, name="udp-" + str(iface));
+        self.reader.daemon = True;
+        self.reader.start();
+
+    def open(self, address, command):
+        """Registers a request, its reply is only accepted after this call"""
+        request = PendingRequest(address, int(command));
+        with self.mutex:
+            self.pending.setdefault(address, []).append(request);
+        return request;
+
+    def send(self, message, address):
+        try:
+            self.sock.sendto(message, address);
+        except OSError:
+            self.close();
+            Interfaces.refresh();
+            raise;
+
+    def release(self, request):
+        """Stops waiting for the reply of a request"""
+        with self.mutex:
+            waiting = self.pending.get(request.address, []);
+            if(request in waiting):
+                waiting.remove(request);
+            if(not waiting):
+                self.pending.pop(request.address, None);
+
+    def close(self):
+        with self.mutex:
+            if(self.closed):
+                return;
+            self.closed = True;
+        try:
+            #close alone does not wake up the reader blocked in recvfrom
+            self.sock.shutdown(socket.SHUT_RDWR);
+        except OSError:
+            pass;
+        self.sock.close();
+
+    def __dispatch(self, data, address):
+        if(len(data) < 12):
+            logging.debug('ignoring short datagram from {}'.format(address));
+            return;
+
+        command = data[8] + (data[9] << 8);
+        with self.mutex:
+            for request in self.pending.get(address, []):
+                if(request.matches(command)):
+                    self.pending[address].remove(request);
+                    request.received = time.monotonic();
+                    request.data = data;
+                    request.event.set();
+                    return;
+
+        logging.debug('discarding late or duplicate reply {} from {}'.format(command, address));
+
+    def __read(self):
+        while not self.closed:
+            try:
+                (data, address) = self.sock.recvfrom(UDPChannel.BUFFER_SIZE);
+            except OSError as e:
+                if(not self.closed):
+                    logging.warning('udp channel on {} failed: {}'.format(self.iface, e));
+                    self.close();
+                return;
+
+            self.__dispatch(data, address);
@@ -2,8 +2,12 @@
 
 from UDPMessage.AxUDPCommand import AxUDPCommand;
 import socket;
+import selectors;
+import time;
 import sys;
 from UDPMessage.AxUDPMessage import AxUDPMessage;
+from UDPMessage.UDPChannel import UDPChannel;
+from UDPMessage.RetransmitPolicy import RetransmitPolicy;
 from AxHw.Interfaces import Interfaces;
 from AxHw.InfoMessage import InfoMessage;
 import logging;
@@ -19,10 +23,13 @@ class UDPHelper(object):
     iface = "";
     sock = None;
 
-    def __init__(self, target, iface, magic):
+    def __init__(self, target, iface, magic, retransmit=None):
         self.target_ip = target
         self.iface = iface
         self.magic = magic
+        #called without arguments when the endpoint did not answer
+        self.timeout_listener = None
+        self.retransmit = RetransmitPolicy(max_timeout=UDPHelper.TIMEOUT) if retransmit is None else retransmit
 
     def create_udp_client(self, ip_address):
         #so = socket.socket(socket.AF_INET, socket.SOCK_DGRAM);
@@ -30,100 +37,179 @@ class UDPHelper(object):
         #return so;
         pass;
 
-    def send_message(self, message):
+    def send_message(self, message, idempotent=False):
+        """
+        Sends a frame and returns the parsed reply.
+        Idempotent commands are retransmitted according to the \ref RetransmitPolicy of the device
+        """
+        return self.send_messages([message], idempotent)[0];
+
+    def send_messages(self, messages, idempotent=False):
+        """
+        Sends frames of different commands in one burst and returns their parsed replies in the same order.
+        Frames which were not answered are retransmitted together if idempotent
+        """
+        target = self.target_ip;
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
-                sock.bind((Interfaces.get_local_ip_from_interface(self.iface), 0));
-                sock.sendto(message, self.target_ip);
-                sock.settimeout(UDPHelper.TIMEOUT);
-                (data, server) = sock.recvfrom(10100);
-
-        except socket.timeout:
-            logging.warning('no answer received from the endpoint {}'.format(self.target_ip));
-            raise TimeoutError('no answer received from the endpoint {}'.format(self.target_ip))
-            pass;
+            channel = UDPChannel.get(self.iface);
+            requests = [(message, channel.open(target, message[8] + (message[9] << 8))) for message in messages];
         except Exception as e :
-            logging.warning('got an exception in the discovery mechanism...');
+            logging.warning('got an exception while sending to {}...'.format(target));
             traceback.print_exc()
             raise e;
 
-        return AxUDPMessage.parse(self.magic, data);
+        try:
+            deadline = time.monotonic() + self.retransmit.max_timeout;
+            for (attempt, timeout) in enumerate(self.retransmit.timeouts(idempotent)):
+                sent = time.monotonic();
+                if(sent >= deadline):
+                    break;
+
+                if(attempt > 0):
+                    logging.debug('retransmitting to {} (attempt {})'.format(target, attempt + 1));
+                for (message, request) in requests:
+                    if(request.data is None):
+                        channel.send(message, target);
+
+                expires = min(sent + timeout, deadline);
+                for (message, request) in requests:
+                    request.wait(max(expires - time.monotonic(), 0));
+
+                if(all(request.data is not None for (message, request) in requests)):
+                    if(attempt == 0):
+                        #the burst is waited for as a whole
+                        self.retransmit.sample(max(request.received for (message, request) in requests) - sent);
+                    break;
+        finally:
+            for (message, request) in requests:
+                channel.release(request);
+
+        if(any(request.data is None for (message, request) in requests)):
+            self.retransmit.backoff();
+            logging.warning('no answer received from the endpoint {}'.format(target));
+            if(self.timeout_listener is not None):
+                self.timeout_listener();
+            raise TimeoutError('no answer received from the endpoint {}'.format(target))
+
+        return [AxUDPMessage.parse(self.magic, request.data) for (message, request) in requests];
 
     def receive(self):
         #TODO
         data, server = sock.recvfrom(UDPHelper.TIMEOUT);
 
     @staticmethod
-    def fill_devices(magic):
-        return UDPHelper.send_broadcast(magic);
+    def fill_devices(*magics):
+        return list(UDPHelper.discover(*magics));
 
     @staticmethod
     def get_info_message_by_broadcast(mac_address, magic):
-        info_messages = UDPHelper.send_broadcast(magic);
-
-        for message in info_messages:
+        #stops listening as soon as the device answered
+        for message in UDPHelper.discover(magic):
             if(bytearray(message.MacAddress) == mac_address):
                 return message;
         return None;
 
     @staticmethod
-    def __parse_message(iface, magic, responses, buffer, address):
+    def __parse_message(iface, magics, buffer, address):
+        magic = next((magic for magic in magics if bytes(buffer[:8]) == bytes(magic)), None);
+        if(magic is None):
+            raise RuntimeError();
+
         msg = AxUDPMessage.parse(magic, buffer);
         info = InfoMessage();
         info.MacAddress = msg.data[2:8];
         info.RemoteIpAddress = address;
         info.Major = msg.data[0];
         info.Minor = msg.data[1];
-        info.iface = iface;
+        #a broadcast can be answered on another interface of the same network, prefer the one owning the subnet
+        info.iface = Interfaces.get_interface_for_address(address[0]) or iface;
         info.magic = magic;
         logging.debug('received IP:{} with Mac:[{}]'.format(info.RemoteIpAddress, ', '.join(hex(x) for x in info.MacAddress)));
-        responses.append(info);
+        return info;
 
     @staticmethod
-    def __transmit_message(s, bytes_array, dest, iface, magic, responses):
+    def __open_broadcast_socket(iface, requests, selector):
+        destIP = Interfaces.get_broadcast_address(iface);
+
+        if(destIP is None):
+            return;
+
+        dest = (destIP, UDPHelper.PORT);
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM);
         try:
-            respondingDevices = 0;
             s.bind((Interfaces.get_local_ip_from_interface(iface), 0));
             s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1);
+            s.setblocking(False);
             logging.debug('sending discovery to {}'.format(dest));
-            s.sendto(bytes_array, dest);
-            
-            s.settimeout(UDPHelper.TIMEOUT);
-            while True:
-                (buf, addr) = s.recvfrom(10100)
-                if(len(buf)):
-                    UDPHelper.__parse_message(iface, magic, responses, buf, addr);
-                    respondingDevices +=1;
-
-        except socket.timeout:
+            for bytes_array in requests:
+                s.sendto(bytes_array, dest);
+            selector.register(s, selectors.EVENT_READ, iface);
+        except Exception as e:
+            logging.warning('discovery on {} failed: {}'.format(iface, e));
+            s.close();
+
+    @staticmethod
+    def discover(*magics, timeout=TIMEOUT):
+        """
+        Sends the INFO broadcast of every magic on all interfaces at once and yields an \ref InfoMessage for every reply as soon as it arrives.
+        The replies of all interfaces are collected until one shared deadline
+        """
+        requests = [];
+        for magic in magics:
+            udp_message = AxUDPMessage(magic);
+            udp_message.command = int(AxUDPCommand.INFO);
+            requests.append(udp_message.get_bytes());
+
+        selector = selectors.DefaultSelector();
+        try:
+            for iface in Interfaces.get_all_network_interfaces_with_broadcast():
+                UDPHelper.__open_broadcast_socket(iface, requests, selector);
+
+            respondingDevices = 0;
+            deadline = time.monotonic() + timeout;
+            while selector.get_map():
+                remaining = deadline - time.monotonic();
+                if(remaining <= 0):
+                    break;
+
+                for (key, events) in selector.select(remaining):
+                    try:
+                        (buf, addr) = key.fileobj.recvfrom(10100);
+                    except BlockingIOError:
+                        continue;
+                    except OSError as e:
+                        logging.warning('discovery on {} failed: {}'.format(key.data, e));
+                        selector.unregister(key.fileobj);
+                        key.fileobj.close();
+                        continue;
+
+                    if(len(buf)):
+                        try:
+                            info = UDPHelper.__parse_message(key.data, magics, buf, addr);
+                        except Exception:
+                            logging.debug('ignoring invalid discovery answer from {}'.format(addr));
+                            continue;
+
+                        respondingDevices += 1;
+                        yield info;
+
             if(respondingDevices == 0):
                 logging.info('no answer received from any endpoint');
-            pass;
-        except TimeoutError:
-            logging.debug('no answer received');
-            pass;
-        except Exception as e :
-            logging.warning('got an exception in the discovery mechanism...');
-            traceback.print_exc()
-            pass;
+        finally:
+            for key in list(selector.get_map().values()):
+                key.fileobj.close();
+            selector.close();
 
     @staticmethod
-    def send_broadcast(magic):
+    def send_broadcast(magic, callback=None):
+        """Returns the \ref InfoMessage of all devices answering the broadcast, callback is called for each one as it arrives"""
         responses = [];
-        udp_message = AxUDPMessage(magic);
-        udp_message.command = int(AxUDPCommand.INFO);
-        bytes_array = udp_message.get_bytes();
-        
-        for iface in Interfaces.get_all_network_interfaces_with_broadcast():
-            destIP = Interfaces.get_broadcast_address(iface);
-
-            if(destIP is None):
-                continue;
-
-            dest = (destIP, UDPHelper.PORT);
-            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-                UDPHelper.__transmit_message(s, bytes_array, dest, iface, magic, responses);
-            
+
+        for info in UDPHelper.discover(magic):
+            responses.append(info);
+            if(callback is not None):
+                callback(info);
+
         return responses;
 
 #a = UDPHelper("10.30.10.88");
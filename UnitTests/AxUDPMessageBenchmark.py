@@ -0,0 +1,28 @@
+#!/usr/bin/python3
+
+"""Encode/decode throughput of the AxUDPMessage codec, run with python3 -m UnitTests.AxUDPMessageBenchmark"""
+
+import timeit
+
+from UDPMessage.AxUDPMessage import AxUDPMessage
+from UDPMessage.UDPMagics import UDPMagics
+
+ITERATIONS = 100000
+
+
+def measure(name, function):
+    seconds = min(timeit.repeat(function, number=ITERATIONS, repeat=5))
+    print("{:<28} {:>12,.0f} frames/s {:>8.3f} us/frame".format(name, ITERATIONS / seconds, seconds / ITERATIONS * 1e6))
+
+
+def main():
+    magic = UDPMagics.CardMagstriperMagic
+    for size in (1, 40, 107):
+        message = AxUDPMessage(magic, 4, bytes(range(size)))
+        frame = bytes(message.get_bytes())
+        measure("encode {} bytes".format(size), message.get_bytes)
+        measure("decode {} bytes".format(size), lambda: AxUDPMessage.parse(magic, frame))
+
+
+if __name__ == '__main__':
+    main()
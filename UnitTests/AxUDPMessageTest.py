@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+
+"""AxUDPMessage codec test routines."""
+
+import unittest
+
+from UDPMessage.AxUDPMessage import AxUDPMessage
+from UDPMessage.UDPMagics import UDPMagics
+
+
+class AxUDPMessageTests(unittest.TestCase):
+    """Test encoding and decoding of the UDP frames."""
+    def setUp(self):  # pylint:disable=C0103
+        self.magic = UDPMagics.CardMultiplexerMagic
+
+    def test_get_bytes(self):
+        message = AxUDPMessage(self.magic)
+        message.command = 0x0104
+        message.data = bytearray([0x10, 0x20, 0x30])
+        self.assertEqual(message.get_bytes(), bytes(self.magic) + bytes([0x04, 0x01, 0x03, 0x00, 0x10, 0x20, 0x30]))
+
+    def test_round_trip(self):
+        message = AxUDPMessage(self.magic, 5, b'\x07')
+        parsed = AxUDPMessage.parse(self.magic, message.get_bytes())
+        self.assertEqual(parsed.command, 5)
+        self.assertEqual(parsed.data, b'\x07')
+
+    def test_data_per_instance(self):
+        first = AxUDPMessage(self.magic)
+        first.data = b'\x01\x02'
+        second = AxUDPMessage(self.magic)
+        self.assertEqual(second.data, b'')
+        self.assertEqual(first.data, b'\x01\x02')
+
+    def test_data_immutable(self):
+        source = bytearray(b'\x01')
+        message = AxUDPMessage(self.magic, 4, source)
+        source[0] = 2
+        self.assertEqual(message.data, b'\x01')
+
+    def test_parse_uses_data_length(self):
+        frame = bytes(self.magic) + bytes([0x04, 0x00, 0x01, 0x00, 0x09, 0xFF, 0xFF])
+        self.assertEqual(AxUDPMessage.parse(self.magic, frame).data, b'\x09')
+
+    def test_parse_short_frame(self):
+        with self.assertRaises(BufferError):
+            AxUDPMessage.parse(self.magic, bytes(self.magic) + b'\x04\x00')
+
+    def test_parse_truncated_data(self):
+        frame = bytes(self.magic) + bytes([0x04, 0x00, 0x05, 0x00, 0x09])
+        with self.assertRaises(BufferError):
+            AxUDPMessage.parse(self.magic, frame)
+
+    def test_parse_wrong_magic(self):
+        frame = AxUDPMessage(UDPMagics.CardMagstriperMagic, 4).get_bytes()
+        with self.assertRaises(RuntimeError):
+            AxUDPMessage.parse(self.magic, frame)
+
+    def test_data_too_long(self):
+        message = AxUDPMessage(self.magic, 4, bytes(AxUDPMessage.MAX_DATA_LENGTH + 1))
+        with self.assertRaises(BufferError):
+            message.get_bytes()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+#!/usr/bin/python3
+
+"""POST /batch test routines."""
+
+import json
+import unittest
+from http import HTTPStatus
+
+import MultiRobotRest
+from Base.DeviceBase import DeviceBase
+from Exception.Exception import ParseError
+
+
+class FakeDevice(DeviceBase):
+    """Records the commands, the command 'fail' is not executed."""
+    def __init__(self):
+        DeviceBase.__init__(self)
+        self.set_state(DeviceBase.READY)
+        self.executed = []
+
+    def send_command(self, command):
+        if(command == "fail"):
+            return False
+        self.executed.append(command)
+        return True
+
+
+class BatchTests(unittest.TestCase):
+    """Test the merging, the status and the validation of a batch."""
+    def setUp(self):  # pylint:disable=C0103
+        self.robot_list = {"a": FakeDevice(), "b": FakeDevice()}
+
+    def post(self, request):
+        response = MultiRobotRest.doPostWork(json.dumps(request), self.robot_list, "/batch").result(5)
+        return (response.code, json.loads(response.body)['batch'])
+
+    def test_merge(self):
+        """Lists for the same device are executed as one sequence."""
+        (code, results) = self.post({"batch": [
+            {"id": "a", "commands": ["1", "2"]},
+            {"id": "b", "commands": ["x"]},
+            {"id": "a", "commands": ["3"]}]})
+        self.assertEqual(code, HTTPStatus.OK)
+        self.assertEqual(self.robot_list["a"].executed, ["1", "2", "3"])
+        self.assertEqual(self.robot_list["b"].executed, ["x"])
+        self.assertEqual([result['id'] for result in results], ["a", "b"])
+        self.assertEqual(len(results[0]['results']), 3)
+
+    def test_partial_failure(self):
+        """The status of the first failure is returned, the other devices still run."""
+        (code, results) = self.post({"batch": [
+            {"id": "a", "commands": ["1", "fail", "2"]},
+            {"id": "b", "commands": ["x"]}]})
+        self.assertEqual(code, HTTPStatus.NOT_FOUND)
+        self.assertEqual([result['status'] for result in results], ["failed", "done"])
+        self.assertEqual(self.robot_list["a"].executed, ["1"])
+        self.assertEqual(self.robot_list["b"].executed, ["x"])
+
+    def test_bad_input(self):
+        """Malformed batches are rejected with 400 before anything is executed."""
+        for request in ({"batch": [1]},
+                        ["x"],
+                        {"batch": "a"},
+                        {"batch": [{"id": "a"}]},
+                        {"batch": [{"id": ["a"], "commands": []}]},
+                        {"batch": [{"id": "a", "commands": "abc"}]}):
+            with self.assertRaises(ParseError) as context:
+                MultiRobotRest.doPostWork(json.dumps(request), self.robot_list, "/batch")
+            self.assertEqual(MultiRobotRest.getErrorStatus(context.exception), HTTPStatus.BAD_REQUEST)
+        self.assertEqual(self.robot_list["a"].executed, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
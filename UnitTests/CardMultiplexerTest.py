@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+
+"""CardMultiplexer port cache test routines."""
+
+import unittest
+
+from AxHw.CardMultiplexer import CardMultiplexer
+
+
+class Port(object):
+    """Layout entry of a multiplexer port."""
+    def __init__(self, value):
+        self.Value = value
+
+
+class FakeSender(object):
+    """Records the SET_PORT commands, raises the scripted errors."""
+    def __init__(self):
+        self.ports = []
+        self.port = 0
+        self.set_error = None
+        self.get_error = None
+        self.reset_listener = None
+
+    def set_port(self, port):
+        if(self.set_error is not None):
+            raise self.set_error
+        self.ports.append(port)
+        self.port = port
+        return True
+
+    def get_port(self):
+        if(self.get_error is not None):
+            raise self.get_error
+        return self.port
+
+
+class FakeManager(object):
+    def __init__(self, sender):
+        self.sender = sender
+
+    def get_sender_for_device(self, mac_address):
+        return self.sender
+
+
+class CardMultiplexerTests(unittest.TestCase):
+    """Test that the cached port is only trusted while the device keeps its state."""
+    def setUp(self):  # pylint:disable=C0103
+        self.sender = FakeSender()
+        self.mux = CardMultiplexer("aabbccddeeff")
+        self.mux.device = FakeManager(self.sender)
+        self.mux.mux_layout = {"PORT 1": Port("1"), "PORT 2": Port("2")}
+        self.sender.reset_listener = self.mux.forget_port
+
+    def test_active_port_skipped(self):
+        self.assertTrue(self.mux.send_command("PORT 1"))
+        self.assertTrue(self.mux.send_command("PORT 1"))
+        self.assertEqual(self.sender.ports, [1])
+
+    def test_reset_forgets_port(self):
+        """After a reset of the device the port is set again."""
+        self.mux.send_command("PORT 1")
+        self.sender.reset_listener()
+        self.assertIsNone(self.mux.active_port)
+        self.assertTrue(self.mux.send_command("PORT 1"))
+        self.assertEqual(self.sender.ports, [1, 1])
+
+    def test_timeout_forgets_port(self):
+        self.mux.send_command("PORT 1")
+        self.sender.set_error = TimeoutError()
+        self.assertFalse(self.mux.send_command("PORT 2"))
+        self.assertIsNone(self.mux.active_port)
+
+    def test_error_resyncs_port(self):
+        """An error reply reads the active port from the device."""
+        self.mux.send_command("PORT 1")
+        self.sender.set_error = AssertionError()
+        self.assertFalse(self.mux.send_command("PORT 2"))
+        self.assertEqual(self.mux.active_port, 1)
+
+    def test_failed_resync_forgets_port(self):
+        """A resync which fails leaves the port unknown instead of raising."""
+        self.mux.send_command("PORT 1")
+        self.sender.set_error = AssertionError()
+        self.sender.get_error = OSError("network is unreachable")
+        self.assertFalse(self.mux.send_command("PORT 2"))
+        self.assertIsNone(self.mux.active_port)
+
+
+if __name__ == "__main__":
+    unittest.main()
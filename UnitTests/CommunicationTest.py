@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+
+"""PEMSocket line framing test routines."""
+
+import socket
+import unittest
+
+from Robot.Communication import PEMSocket
+
+
+class PEMSocketTests(unittest.TestCase):
+    """Test the line framing of the robot replies."""
+    def setUp(self):  # pylint:disable=C0103
+        self.pem_socket = PEMSocket("127.0.0.1", 0)
+        (self.pem_socket.Connection, self.robot) = socket.socketpair()
+        self.pem_socket.Connection.settimeout(1.0)
+
+    def tearDown(self):  # pylint:disable=C0103
+        self.pem_socket.close()
+        self.robot.close()
+
+    def test_split_reply(self):
+        """A reply split across several reads is returned once complete."""
+        self.robot.sendall(b"o")
+        self.robot.sendall(b"k\r")
+        self.robot.sendall(b"\n")
+        self.assertEqual(self.pem_socket.receive(), "ok")
+
+    def test_merged_replies(self):
+        """Several replies within one read are returned one by one."""
+        self.robot.sendall(b"ok\r\nok\r\n!!\r\n")
+        self.assertEqual(self.pem_socket.receive(), "ok")
+        self.assertEqual(self.pem_socket.receive(), "ok")
+        self.assertEqual(self.pem_socket.receive(), "!!")
+
+    def test_empty_lines_skipped(self):
+        """Blank lines carry no reply and are skipped."""
+        self.robot.sendall(b"\r\n\r\nok\r\n")
+        self.assertEqual(self.pem_socket.receive(), "ok")
+
+    def test_timeout(self):
+        """An incomplete line raises a timeout."""
+        self.robot.sendall(b"ok")
+        self.assertRaises(TimeoutError, self.pem_socket.receive)
+
+    def test_closed_by_peer(self):
+        """A closed connection is signaled by an empty string."""
+        self.robot.close()
+        self.assertEqual(self.pem_socket.receive(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+
+"""DeviceQueue test routines."""
+
+import threading
+import time
+import unittest
+from http import HTTPStatus
+
+from Base.DeviceQueue import DeviceQueue
+from Exception.Exception import QueueFullError, QueueTimeoutError
+from Rest.RestHandler import getErrorStatus, getErrorHeaders
+
+
+class DeviceQueueTests(unittest.TestCase):
+    """Test the bounded FIFO of the device work."""
+    def setUp(self):  # pylint:disable=C0103
+        self.queue = DeviceQueue("test", max_depth=2, max_wait=5.0)
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def tearDown(self):  # pylint:disable=C0103
+        self.release.set()
+
+    def block(self):
+        """Keeps the worker busy until self.release is set."""
+        self.started.set()
+        self.release.wait(5)
+
+    def test_fifo(self):
+        """Work is executed in the order it was submitted."""
+        self.queue.max_depth = 16
+        order = []
+        futures = [self.queue.submit(order.append, i) for i in range(10)]
+        for future in futures:
+            future.result(5)
+        self.assertEqual(order, list(range(10)))
+
+    def test_full(self):
+        """Work beyond max_depth is rejected with 429 and Retry-After."""
+        self.queue.submit(self.block)
+        self.assertTrue(self.started.wait(5))
+        self.queue.submit(time.sleep, 0)
+        self.queue.submit(time.sleep, 0)
+        with self.assertRaises(QueueFullError) as context:
+            self.queue.submit(time.sleep, 0)
+        self.assertEqual(getErrorStatus(context.exception), HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', getErrorHeaders(context.exception))
+        self.assertEqual(self.queue.status()['rejected'], 1)
+
+    def test_expired(self):
+        """Work which could not start within max_wait fails with QueueTimeoutError."""
+        self.queue.max_wait = 0.05
+        self.queue.submit(self.block)
+        self.assertTrue(self.started.wait(5))
+        waiting = self.queue.submit(time.sleep, 0)
+        time.sleep(0.1)
+        self.release.set()
+        with self.assertRaises(QueueTimeoutError):
+            waiting.result(5)
+        self.assertEqual(self.queue.status()['expired'], 1)
+
+    def test_cancel(self):
+        """Cancelled work is skipped, also after it expired, and the worker keeps running."""
+        self.queue.max_wait = 0.05
+        self.queue.submit(self.block)
+        self.assertTrue(self.started.wait(5))
+        executed = []
+        cancelled = self.queue.submit(executed.append, 1)
+        self.assertTrue(cancelled.cancel())
+        time.sleep(0.1)
+        self.release.set()
+
+        self.assertEqual(self.queue.submit(lambda: 2).result(5), 2)
+        self.assertTrue(cancelled.cancelled())
+        self.assertEqual(executed, [])
+        self.assertEqual(self.queue.status()['expired'], 0)
+
+    def test_failing_work(self):
+        """An exception of the work is reported through its future."""
+        future = self.queue.submit(int, "x")
+        with self.assertRaises(ValueError):
+            future.result(5)
+        self.assertEqual(self.queue.submit(lambda: 3).result(5), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+
+"""GCodeStream pipelining test routines."""
+
+import unittest
+
+from Exception.Exception import ConnectionError, DeviceStateError
+from Robot.GCodeStream import GCodeStream
+from Robot.PinRobot import PinRobot
+
+
+class FakeSocket(object):
+    """Answers with the scripted replies and records every send."""
+    def __init__(self, replies, sent=True):
+        self.replies = list(replies)
+        self.sent = sent
+        self.messages = []
+        self.stream = None
+        self.max_in_flight = 0
+
+    def send(self, message):
+        self.messages.append(message.split("\r\n"))
+        return self.sent
+
+    def receive(self):
+        if(self.stream is not None):
+            self.max_in_flight = max(self.max_in_flight, len(self.stream.in_flight))
+        reply = self.replies.pop(0) if self.replies else ""
+        if(isinstance(reply, Exception)):
+            raise reply
+        return reply
+
+    def close(self):
+        pass
+
+
+class Terminal(object):
+    """Layout entry of a terminal action."""
+    def __init__(self, value):
+        self.Value = value
+        self.IsButton = False
+
+
+class GCodeStreamTests(unittest.TestCase):
+    """Test the matching of the replies to the lines in flight."""
+    def stream(self, replies, window, count=4, sent=True):
+        self.socket = FakeSocket(replies, sent)
+        self.gcode = GCodeStream(self.socket, window)
+        self.socket.stream = self.gcode
+        return self.gcode.stream(("G{}".format(i), i) for i in range(count))
+
+    def test_window(self):
+        """At most window lines are in flight, the free slots are refilled together."""
+        tags = list(self.stream(["ok"] * 4, 2))
+        self.assertEqual(tags, [0, 1, 2, 3])
+        self.assertEqual(self.socket.messages, [["G0", "G1"], ["G2"], ["G3"]])
+        self.assertEqual(self.socket.max_in_flight, 2)
+        self.assertTrue(self.gcode.idle())
+
+    def test_prompt(self):
+        """The prompt in front of a reply is ignored."""
+        self.assertEqual(list(self.stream(["> ok", ">ok", ">  ok ", "ok"], 4)), [0, 1, 2, 3])
+
+    def test_error_in_window(self):
+        """'!!' fails the oldest line in flight, the lines after it stay unacknowledged."""
+        tags = self.stream(["ok", "> !!", "ok"], 3)
+        self.assertEqual(next(tags), 0)
+        with self.assertRaises(DeviceStateError) as context:
+            next(tags)
+        self.assertEqual(context.exception.expression, "G1")
+        self.assertEqual(list(self.gcode.in_flight), [("G1", 1), ("G2", 2), ("G3", 3)])
+        self.assertFalse(self.gcode.idle())
+
+    def test_other_replies_skipped(self):
+        """Replies which are neither ok nor !! acknowledge nothing."""
+        self.assertEqual(list(self.stream(["X:0 Y:0", "ok"], 1, count=1)), [0])
+
+    def test_connection_lost(self):
+        """A closed connection fails the stream."""
+        tags = self.stream(["ok"], 2)
+        self.assertEqual(next(tags), 0)
+        self.assertRaises(ConnectionError, next, tags)
+
+    def test_send_failed(self):
+        """A failing send fails the stream."""
+        self.assertRaises(ConnectionError, list, self.stream([], 2, sent=False))
+
+
+class PinRobotTests(unittest.TestCase):
+    """Test the results of the actions streamed by the robot."""
+    def setUp(self):  # pylint:disable=C0103
+        self.robot = PinRobot()
+        self.robot.terminalList = {"A": Terminal("G0 X1\nG0 Y1"), "B": Terminal("G0 X2")}
+
+    def test_results(self):
+        self.robot.socket = FakeSocket(["ok"] * 3)
+        self.assertEqual(list(self.robot.send_commands(["A", "B"])), [("A", True), ("B", True)])
+
+    def test_unknown_exception(self):
+        """An unexpected error is reported for the action which was performed."""
+        self.robot.socket = FakeSocket(["ok", "ok", RuntimeError("unexpected")])
+        self.assertEqual(list(self.robot.send_commands(["A", "B"])), [("A", True), ("B", False)])
+
+    def test_unknown_action(self):
+        self.robot.socket = FakeSocket(["ok", "ok"])
+        self.assertEqual(list(self.robot.send_commands(["A", "C"])), [("A", True), ("C", False)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+#!/usr/bin/python3
+
+"""Magstripe layout compilation test routines."""
+
+import unittest
+
+from Exception.Exception import ParseError
+from Parsers.ParseXml import MagstripeComand, MagstripeTrack
+from UDPMessage.AxUDPCardMagstriperCommand import AxUDPCardMagstriperCommand
+from UDPMessage.AxUDPMessage import AxUDPMessage
+from UDPMessage.UDPMagics import UDPMagics
+
+
+class MagstripeTrackTests(unittest.TestCase):
+    """Test the validation and encoding of the tracks."""
+    def test_track1_is_reduced(self):
+        track = MagstripeTrack(1, "%B1^A?")
+        self.assertEqual(track.data, bytes([0x05, 0x22, 0x11, 0x3E, 0x21, 0x1F]))
+
+    def test_frame(self):
+        track = MagstripeTrack(2, ";123=4?")
+        message = AxUDPMessage.parse(UDPMagics.CardMagstriperMagic, track.frame)
+        self.assertEqual(message.command, int(AxUDPCardMagstriperCommand.SetTrack2))
+        self.assertEqual(message.data, b";123=4?")
+
+    def test_lrc(self):
+        # ; 1 2 3 ? -> 0xB ^ 0x1 ^ 0x2 ^ 0x3 ^ 0xF = 0x4
+        self.assertEqual(MagstripeTrack(2, ";123?").lrc, "4")
+
+    def test_invalid_character(self):
+        with self.assertRaises(ParseError):
+            MagstripeTrack(2, ";12A?")
+
+    def test_too_long(self):
+        with self.assertRaises(ParseError):
+            MagstripeTrack(2, ";" + "1" * 40 + "?")
+
+    def test_command_tracks(self):
+        command = MagstripeComand("SELECT CARD 1", "Visa", None, ";1=2?", ";3?")
+        self.assertEqual(sorted(command.tracks), [AxUDPCardMagstriperCommand.SetTrack2, AxUDPCardMagstriperCommand.SetTrack3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+
+"""RetransmitPolicy and UDP retransmission test routines."""
+
+import time
+import unittest
+from unittest import mock
+
+from UDPMessage.AxUDPMessage import AxUDPMessage
+from UDPMessage.RetransmitPolicy import RetransmitPolicy
+from UDPMessage.UDPChannel import PendingRequest
+from UDPMessage.UDPHelper import UDPHelper
+from UDPMessage.UDPMagics import UDPMagics
+
+
+class RetransmitPolicyTests(unittest.TestCase):
+    """Test the retransmission timeout estimation."""
+    def test_initial_timeouts(self):
+        """Idempotent commands double the timeout up to max_timeout, others wait once."""
+        policy = RetransmitPolicy(max_retries=4, initial_timeout=0.25, max_timeout=2.0)
+        self.assertEqual(policy.timeouts(True), [0.25, 0.5, 1.0, 2.0, 2.0])
+        self.assertEqual(policy.timeouts(False), [2.0])
+
+    def test_sample(self):
+        """SRTT and RTTVAR follow RFC 6298."""
+        policy = RetransmitPolicy()
+        policy.sample(0.1)
+        self.assertAlmostEqual(policy.srtt, 0.1)
+        self.assertAlmostEqual(policy.rttvar, 0.05)
+        self.assertAlmostEqual(policy.timeout, 0.3)
+
+        policy.sample(0.2)
+        self.assertAlmostEqual(policy.rttvar, 0.75 * 0.05 + 0.25 * 0.1)
+        self.assertAlmostEqual(policy.srtt, 0.875 * 0.1 + 0.125 * 0.2)
+        self.assertAlmostEqual(policy.timeout, policy.srtt + 4 * policy.rttvar)
+
+    def test_bounds(self):
+        """The timeout stays between min_timeout and max_timeout."""
+        policy = RetransmitPolicy(min_timeout=0.02, max_timeout=2.0)
+        policy.sample(0.001)
+        self.assertAlmostEqual(policy.timeout, 0.02)
+
+        for _ in range(10):
+            policy.backoff()
+        self.assertAlmostEqual(policy.timeout, 2.0)
+
+        policy.sample(5.0)
+        self.assertAlmostEqual(policy.timeout, 2.0)
+
+
+class FakeChannel(object):
+    """Answers the transmissions listed in 'answered', counted from 1."""
+    def __init__(self, answered):
+        self.answered = answered
+        self.sent = 0
+        self.requests = []
+
+    def open(self, address, command):
+        request = PendingRequest(address, command)
+        self.requests.append(request)
+        return request
+
+    def send(self, message, address):
+        self.sent += 1
+        if(self.sent in self.answered):
+            request = self.requests[-1]
+            request.received = time.monotonic()
+            request.data = bytes(AxUDPMessage(UDPMagics.CardMultiplexerMagic, request.command).get_bytes())
+            request.event.set()
+
+    def release(self, request):
+        pass
+
+
+class RetransmitTests(unittest.TestCase):
+    """Test the retransmission loop of UDPHelper.send_messages."""
+    def setUp(self):  # pylint:disable=C0103
+        self.policy = RetransmitPolicy(max_retries=3, initial_timeout=0.01, max_timeout=1.0)
+        self.helper = UDPHelper("127.0.0.1", "lo", UDPMagics.CardMultiplexerMagic, self.policy)
+        self.timeouts = []
+        self.helper.timeout_listener = lambda: self.timeouts.append(True)
+        self.message = AxUDPMessage(UDPMagics.CardMultiplexerMagic, 4, b'\x01').get_bytes()
+
+    def send(self, answered, idempotent):
+        channel = FakeChannel(answered)
+        with mock.patch('UDPMessage.UDPHelper.UDPChannel.get', return_value=channel):
+            try:
+                return (channel, self.helper.send_message(self.message, idempotent))
+            except TimeoutError:
+                return (channel, None)
+
+    def test_first_answer_is_sampled(self):
+        """A reply to the first transmission updates the round trip time."""
+        (channel, reply) = self.send({1}, True)
+        self.assertEqual(reply.command, 4)
+        self.assertEqual(channel.sent, 1)
+        self.assertIsNotNone(self.policy.srtt)
+
+    def test_retransmission_is_not_sampled(self):
+        """Karn's algorithm: a reply to a retransmitted command is ambiguous."""
+        (channel, reply) = self.send({2}, True)
+        self.assertEqual(reply.command, 4)
+        self.assertEqual(channel.sent, 2)
+        self.assertIsNone(self.policy.srtt)
+        self.assertEqual(self.timeouts, [])
+
+    def test_idempotent_retries(self):
+        """An idempotent command is sent max_retries + 1 times and the timeout backs off."""
+        (channel, reply) = self.send(set(), True)
+        self.assertIsNone(reply)
+        self.assertEqual(channel.sent, 4)
+        self.assertAlmostEqual(self.policy.timeout, 0.02)
+        self.assertEqual(self.timeouts, [True])
+
+    def test_not_idempotent(self):
+        """Other commands are sent once and wait max_timeout."""
+        self.policy.max_timeout = 0.05
+        (channel, reply) = self.send(set(), False)
+        self.assertIsNone(reply)
+        self.assertEqual(channel.sent, 1)
+        self.assertEqual(self.timeouts, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
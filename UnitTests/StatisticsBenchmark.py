@@ -0,0 +1,36 @@
+#!/usr/bin/python3
+
+"""Sustained insert rate of the statistics, run with python3 -m UnitTests.StatisticsBenchmark"""
+
+import os
+import random
+import tempfile
+import time
+
+from SQL.Statistics import Statistics
+
+RECORDS = 100000
+
+
+def main():
+    file_name = tempfile.NamedTemporaryFile(suffix=".db", prefix="statistics").name
+    statistics = Statistics(file_name)
+    try:
+        start = time.monotonic()
+        for i in range(RECORDS):
+            values = (time.strftime('%Y-%m-%d %H:%M:%S'), "robot-{}".format(i % 16), "PRESS {}".format(i % 10), "G0 X1 Y2", random.uniform(1, 50))
+            # blocks while the queue is full, so the writer is measured instead of the dropping
+            statistics.sqlWorker.execute(Statistics.INSERT, values)
+        count = statistics.sqlWorker.execute("SELECT count(*) FROM statistics")[0][0]
+        seconds = time.monotonic() - start
+
+        print("{} records in {:.2f}s: {:,.0f} inserts/s".format(count, seconds, count / seconds))
+    finally:
+        statistics.sqlWorker.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(file_name + suffix):
+                os.unlink(file_name + suffix)
+
+
+if __name__ == '__main__':
+    main()
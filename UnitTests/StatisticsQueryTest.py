@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+
+"""Statistics rollup and query test routines."""
+
+import os
+import queue
+import tempfile
+import unittest
+from unittest import mock
+
+from Exception.Exception import BusyError
+from SQL.Statistics import Statistics
+
+
+class StatisticsQueryTests(unittest.TestCase):
+    """Test the reports served from the rollups."""
+    def setUp(self):  # pylint:disable=C0103
+        self.tmp_file = tempfile.NamedTemporaryFile(
+            suffix="pytest", prefix="statistics").name
+        self.statistics = Statistics(self.tmp_file)
+        for i in range(100):
+            self.statistics.insert("robot-{}".format(i % 2), "PRESS {}".format(i % 4), "G0", (i + 1) / 1000.0)
+
+    def tearDown(self):  # pylint:disable=C0103
+        self.statistics.sqlWorker.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.tmp_file + suffix):
+                os.unlink(self.tmp_file + suffix)
+
+    def test_presses(self):
+        presses = self.statistics.presses(bucket='day').result(5)
+        self.assertEqual([(entry['robot_id'], entry['count']) for entry in presses], [("robot-0", 50), ("robot-1", 50)])
+
+    def test_commands(self):
+        commands = self.statistics.commands(robot_id="robot-0").result(5)
+        self.assertEqual(sorted(entry['command_id'] for entry in commands), ["PRESS 0", "PRESS 2"])
+        self.assertEqual(sum(entry['count'] for entry in commands), 50)
+
+    def test_latency(self):
+        (latency,) = self.statistics.latency(robot_id="robot-1", bucket='month').result(5)
+        self.assertEqual(latency['count'], 50)
+        # durations 2..100 ms, the percentile is the upper bound of its bin
+        self.assertTrue(50 <= latency['p50'] <= 50 * 1.19)
+        self.assertTrue(100 <= latency['p99'] <= 100 * 1.19)
+
+    def test_latency_buckets(self):
+        for (timestamp, duration) in (("2018-03-01 10:15:00", 10.0), ("2018-03-01 11:15:00", 40.0),
+                                      ("2018-03-01 11:45:00", 40.0)):
+            self.statistics.sqlWorker.execute(Statistics.INSERT, (timestamp, "robot-2", "PRESS", "G0", duration))
+        latency = self.statistics.latency(robot_id="robot-2").result(5)
+        self.assertEqual([(entry['bucket'], entry['count']) for entry in latency],
+                         [("2018-03-01 10", 1), ("2018-03-01 11", 2)])
+        self.assertTrue(latency[0]['p50'] < latency[1]['p50'])
+
+        (day,) = self.statistics.latency(robot_id="robot-2", bucket='day').result(5)
+        self.assertEqual((day['bucket'], day['count']), ("2018-03-01", 3))
+
+    def test_sqlite_version(self):
+        with mock.patch('SQL.Statistics.sqlite3.sqlite_version_info', (3, 23, 1)):
+            with self.assertRaises(RuntimeError):
+                Statistics(self.tmp_file)
+
+    def test_buffer_full(self):
+        with mock.patch.object(self.statistics.sqlWorker.sql_queue, 'put', side_effect=queue.Full):
+            with self.assertRaises(BusyError):
+                self.statistics.presses()
+
+    def test_rollup_matches_table(self):
+        self.assertEqual(
+            self.statistics.sqlWorker.execute("SELECT count(*) FROM statistics"),
+            self.statistics.sqlWorker.execute("SELECT sum(count) FROM statistics_rollup"))
+
+
+if __name__ == "__main__":
+    unittest.main()
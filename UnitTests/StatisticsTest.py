@@ -1,13 +1,21 @@
+import os
+import tempfile
+
 from SQL.Statistics import Statistics
 
 def main():
-    statistics = Statistics()
-    statistics.insert("ingenico", "PRESS 1", "G0 TEST")
-    statistics.insert("ingenico", "PRESS 2", "G0 TEST")
-    statistics.insert("ingenico", "PRESS 3", "G0 TEST")
-    statistics.insert("ingenico", "PRESS 4", "G0 TEST")
+    file_name = tempfile.NamedTemporaryFile(suffix=".db", prefix="statistics").name
+    statistics = Statistics(file_name)
+    try:
+        statistics.insert("ingenico", "PRESS 1", "G0 TEST")
+        statistics.insert("ingenico", "PRESS 2", "G0 TEST")
+        statistics.insert("ingenico", "PRESS 3", "G0 TEST")
+        statistics.insert("ingenico", "PRESS 4", "G0 TEST")
+    finally:
+        statistics.sqlWorker.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(file_name + suffix):
+                os.unlink(file_name + suffix)
 
 
 main()
-
-
@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+
+"""Transaction step graph test routines."""
+
+import threading
+import time
+import unittest
+
+from Base.DeviceQueue import DeviceQueue
+from Exception.Exception import InputError, ParseError, QueueFullError
+from Jobs.Transaction import Step, Transaction
+
+
+class FakeDevice(object):
+    """Only the queue of a device is used by the transaction."""
+    def __init__(self, name, max_depth=16, max_wait=5.0):
+        self.queue = DeviceQueue(name, max_depth, max_wait)
+
+
+class TransactionTests(unittest.TestCase):
+    """Test dependencies, timing and abort of the transaction steps."""
+    def setUp(self):  # pylint:disable=C0103
+        self.devices = {name: FakeDevice(name) for name in ("a", "b", "c")}
+        self.executed = []
+        self.mutex = threading.Lock()
+
+    def execute(self, device, commands, key, progress):
+        """Records the commands, a command 'fail' fails the step."""
+        with self.mutex:
+            self.executed.append((key, commands[0]))
+        for command in commands:
+            if(command == "fail"):
+                raise InputError("", key + ": could not execute: fail")
+            if(command.startswith("sleep")):
+                time.sleep(float(command.split()[1]))
+            progress(command, True)
+
+    def get_device(self, entry):
+        return (entry['id'], self.devices[entry['id']], entry['commands'])
+
+    def run_transaction(self, steps):
+        steps = Transaction.parse({'steps': steps}, self.get_device)
+        transaction = Transaction(steps, self.execute)
+        return transaction.submit().result(5).to_dict()
+
+    def test_dependencies(self):
+        """A step starts after its dependencies finished."""
+        result = self.run_transaction([
+            {"name": "first", "id": "a", "commands": ["sleep 0.05"]},
+            {"name": "second", "id": "b", "commands": ["x"], "after": "first"},
+            {"name": "third", "id": "c", "commands": ["y"], "after": ["second"]}])
+        self.assertEqual(result['status'], Step.DONE)
+        (first, second, third) = result['steps']
+        self.assertGreaterEqual(second['started'], first['finished'])
+        self.assertGreaterEqual(third['started'], second['finished'])
+        self.assertEqual([key for (key, command) in self.executed], ["a", "b", "c"])
+
+    def test_device_order(self):
+        """Steps of the same device run in the given order, even without dependencies."""
+        result = self.run_transaction([
+            {"name": "slow", "id": "b", "commands": ["sleep 0.05"]},
+            {"name": "first", "id": "a", "commands": ["1"], "after": "slow"},
+            {"name": "second", "id": "a", "commands": ["2"]}])
+        self.assertEqual(result['status'], Step.DONE)
+        self.assertEqual([command for (key, command) in self.executed if key == "a"], ["1", "2"])
+
+    def test_delay(self):
+        """A step starts delay_ms after its dependencies finished."""
+        result = self.run_transaction([
+            {"name": "first", "id": "a", "commands": ["x"]},
+            {"name": "second", "id": "b", "commands": ["y"], "after": "first", "delay_ms": 50}])
+        second = result['steps'][1]
+        self.assertGreaterEqual(second['started'] - second['ready'], 50)
+
+    def test_within(self):
+        """A step which starts too late fails and the remaining steps are skipped."""
+        result = self.run_transaction([
+            {"name": "first", "id": "a", "commands": ["x"]},
+            {"name": "late", "id": "b", "commands": ["y"], "after": "first", "delay_ms": 50, "within_ms": 10},
+            {"name": "last", "id": "c", "commands": ["z"], "after": "late"}])
+        self.assertEqual(result['status'], Step.FAILED)
+        self.assertEqual([step['status'] for step in result['steps']], [Step.DONE, Step.FAILED, Step.SKIPPED])
+        self.assertNotIn(("b", "y"), self.executed)
+
+    def test_abort(self):
+        """A failing step aborts the transaction."""
+        result = self.run_transaction([
+            {"name": "first", "id": "a", "commands": ["fail"]},
+            {"name": "second", "id": "b", "commands": ["y"], "after": "first"}])
+        self.assertEqual(result['status'], Step.FAILED)
+        self.assertEqual([step['status'] for step in result['steps']], [Step.FAILED, Step.SKIPPED])
+
+    def test_rollback(self):
+        """Holds queued before a full device are cancelled and the devices keep working."""
+        release = threading.Event()
+        self.devices["a"] = FakeDevice("a", max_wait=0.05)
+        self.devices["b"] = FakeDevice("b", max_depth=0)
+        self.devices["a"].queue.submit(release.wait, 5)
+
+        with self.assertRaises(QueueFullError):
+            self.run_transaction([
+                {"name": "first", "id": "a", "commands": ["x"]},
+                {"name": "second", "id": "b", "commands": ["y"]}])
+
+        time.sleep(0.1)
+        release.set()
+        self.assertEqual(self.devices["a"].queue.submit(lambda: 1).result(5), 1)
+        self.assertEqual(self.executed, [])
+
+    def test_parse_errors(self):
+        """Invalid steps are rejected with ParseError."""
+        for steps in ([1],
+                      [{"name": 1, "id": "a", "commands": []}],
+                      [{"id": "a", "commands": [], "after": [["x"]]}],
+                      [{"id": "a", "commands": [], "after": "later"}],
+                      [{"name": "x", "id": "a", "commands": []}, {"name": "x", "id": "b", "commands": []}],
+                      [{"id": "a", "commands": [], "delay_ms": "soon"}]):
+            with self.assertRaises(ParseError):
+                Transaction.parse({'steps': steps}, self.get_device)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+#!/usr/bin/python3
+
+"""UDPChannel test routines."""
+
+import unittest
+from unittest import mock
+
+from UDPMessage.UDPChannel import UDPChannel
+
+
+class UDPChannelTests(unittest.TestCase):
+    """Test the lifetime of the shared channel."""
+    def setUp(self):  # pylint:disable=C0103
+        patcher = mock.patch('UDPMessage.UDPChannel.Interfaces.get_local_ip_from_interface', return_value='127.0.0.1')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_close_stops_reader(self):
+        """Closing a channel ends its reader thread."""
+        channel = UDPChannel('lo')
+        channel.close()
+        channel.reader.join(1.0)
+        self.assertFalse(channel.reader.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -27,9 +27,11 @@ __email__ = "shawnl@palantir.com"
 __license__ = "MIT"
 
 import os
+import sqlite3
 import tempfile
 import time
 import unittest
+from unittest import mock
 import sys
 
 from SQL.SqlWorker import Sqlite3Worker
@@ -47,16 +49,15 @@ class Sqlite3WorkerTests(unittest.TestCase):  # pylint:disable=R0904
 
     def tearDown(self):  # pylint:disable=C0103
         self.sqlite3worker.close()
-        os.unlink(self.tmp_file)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.tmp_file + suffix):
+                os.unlink(self.tmp_file + suffix)
 
     def test_bad_select(self):
         """Test a bad select query."""
         query = "select THIS IS BAD SQL"
-        self.assertEqual(
-            self.sqlite3worker.execute(query),
-            (
-                "Query returned error: select THIS IS BAD SQL: "
-                "[]: no such column: THIS"))
+        with self.assertRaises(sqlite3.OperationalError):
+            self.sqlite3worker.execute(query)
 
     def test_bad_insert(self):
         """Test a bad insert query."""
@@ -85,6 +86,85 @@ class Sqlite3WorkerTests(unittest.TestCase):  # pylint:disable=R0904
             self.sqlite3worker.execute("SELECT * from tester"),
             [("2010-01-01 13:00:00", "bow"), ("2011-02-02 14:14:14", "dog")])
 
+    def test_batched_insert(self):
+        """Test a batch of inserts with one failing row."""
+        rows = [("2010-01-01 13:00:00", "bow\""), ("bad",), ("2011-02-02 14:14:14", "dog")]
+        for values in rows:
+            self.sqlite3worker.execute("INSERT into tester values (?, ?)", values)
+        self.assertEqual(
+            self.sqlite3worker.execute("SELECT * from tester"),
+            [("2010-01-01 13:00:00", "bow\""), ("2011-02-02 14:14:14", "dog")])
+
+    def test_one_transaction_per_batch(self):
+        """Test that different statements of a batch commit once."""
+        statements = []
+        self.sqlite3worker.sqlite3_conn.set_trace_callback(statements.append)
+        self.sqlite3worker.execute_nowait(
+            "INSERT into tester values (?, ?)", ("2010-01-01 13:00:00", "a"))
+        self.sqlite3worker.execute_nowait(
+            "INSERT into tester values (?, ?)", ("2010-01-01 13:00:01", "a"))
+        self.sqlite3worker.execute_nowait(
+            "INSERT into tester (uuid) values (?)", ("b",))
+        self.sqlite3worker.execute_nowait(
+            "INSERT into tester values (?, ?)", ("2011-02-02 14:14:14", "c"))
+        self.assertEqual(
+            len(self.sqlite3worker.execute("SELECT * from tester")), 4)
+        # The next batch starts after the commit of the first one.
+        self.sqlite3worker.execute("SELECT 1")
+        statements = statements[:statements.index("COMMIT")]
+        self.assertEqual(statements.count("BEGIN"), 1)
+
+    def test_failed_commit(self):
+        """Test that the thread survives a batch which can not commit."""
+        self.sqlite3worker.execute(
+            "CREATE TABLE parent (id INTEGER PRIMARY KEY)")
+        self.sqlite3worker.execute(
+            "CREATE TABLE child (parent_id INTEGER REFERENCES parent(id) "
+            "DEFERRABLE INITIALLY DEFERRED)")
+        self.assertEqual(self.sqlite3worker.execute("SELECT 1"), [(1,)])
+        while self.sqlite3worker.sqlite3_conn.in_transaction:
+            time.sleep(.01)
+        # Only takes effect outside of a transaction.
+        self.sqlite3worker.sqlite3_conn.execute("PRAGMA foreign_keys=ON")
+        # The missing parent fails the commit, not the insert.
+        self.sqlite3worker.execute("INSERT into child values (?)", (1,))
+        self.assertEqual(
+            self.sqlite3worker.execute("SELECT 1", timeout=5), [(1,)])
+        self.assertEqual(
+            self.sqlite3worker.execute("SELECT count(*) from child",
+                                       timeout=5), [(0,)])
+
+    def test_failed_batch(self):
+        """Test that the selects of a failed batch get the error."""
+        with mock.patch.object(
+                self.sqlite3worker, "run_batch",
+                side_effect=sqlite3.OperationalError("disk I/O error")):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.sqlite3worker.execute("SELECT 1", timeout=5)
+        self.assertEqual(
+            self.sqlite3worker.execute("SELECT 1", timeout=5), [(1,)])
+
+    def test_wal_mode(self):
+        """Test the journal mode of the database."""
+        self.assertEqual(
+            self.sqlite3worker.execute("SELECT * from pragma_journal_mode"),
+            [("wal",)])
+
+    def test_select_latency(self):
+        """Test that a select returns as soon as it was executed."""
+        start = time.monotonic()
+        self.sqlite3worker.execute("SELECT * from tester")
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_select_timeout(self):
+        """Test a select which does not finish in time."""
+        query = (
+            "SELECT count(*) FROM (WITH RECURSIVE c(x) AS "
+            "(SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 3000000) "
+            "SELECT x FROM c)")
+        with self.assertRaises(TimeoutError):
+            self.sqlite3worker.execute(query, timeout=0.01)
+
 
 if __name__ == "__main__":
     unittest.main()